@@ -1,8 +1,9 @@
+from typing import Any, Dict
+
 from continuous_eval.eval.result_types import MetricsResults, TestResults
 
 
-def print_metric_results(metrics: MetricsResults) -> None:
-    agg = metrics.aggregate()
+def print_aggregated_results(agg: Dict[str, Dict[str, Any]]) -> None:
     print("# Metrics results:")
     for module_name, module_results in agg.items():
         print(f"> {module_name}")
@@ -11,6 +12,10 @@ def print_metric_results(metrics: MetricsResults) -> None:
     print("\n")
 
 
+def print_metric_results(metrics: MetricsResults) -> None:
+    print_aggregated_results(metrics.aggregate())
+
+
 def print_test_results(tests: TestResults) -> None:
     print("# Tests results:")
     for module_name, test_results in tests.results.items():
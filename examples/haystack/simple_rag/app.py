@@ -12,17 +12,23 @@ from continuous_eval.metrics.retrieval import PrecisionRecallF1, RankedRetrieval
 from haystack import Pipeline
 from haystack.components.builders import PromptBuilder
 from haystack.components.embedders import SentenceTransformersTextEmbedder
-from haystack.components.generators import OpenAIGenerator
-from haystack.components.retrievers.in_memory import InMemoryEmbeddingRetriever
 
 # from examples.haystack.utils.conciseness import Conciseness
+from examples.haystack.utils.generators import CachedOpenAIGenerator
 from examples.haystack.utils.p2p import PipelineEvaluator
-from examples.haystack.utils.preprocessor import preprocess_documents
+from examples.haystack.utils.preprocessor import load_documents
+from examples.haystack.utils.simulated import SimulatedGenerator, SimulatedTextEmbedder
+from examples.haystack.utils.snapshot import SnapshotEmbeddingRetriever
+from examples.utils.simulation import simulation_enabled
 
 # Set environment variable to disable multiprocessing inside continuous-eval
 # Note: this helps to avoid issues with haystack
 os.environ["CONTINUOUS_EVAL_DISABLE_MULTIPROCESSING"] = "true" 
 
+# Evaluate each question as soon as it is answered (`PIPELINED_EVAL=false`: batched run
+# of the whole dataset, then evaluation)
+PIPELINED_EVAL = os.getenv("PIPELINED_EVAL", "true").lower() == "true"
+
 _PROMPT_TEMPLATE = """
 Given the following information, answer the question.
 
@@ -38,16 +44,22 @@ Answer:
 if __name__ == "__main__":
 
     # Fetch the Data
-    print("Preprocessing document store")
+    # The documents are only preprocessed (and embedded) when the essays or the
+    # settings change, the snapshot is memory-mapped otherwise
+    print("Loading document store")
     doc_dir = Path("data/paul_graham/documents/208_219_graham_essays")
-    document_store = preprocess_documents(doc_dir)
+    document_store = load_documents(doc_dir, Path("data/paul_graham/haystack_snapshot"))
     print("Done")
 
     # Building a simple RAG Pipeline
-    text_embedder = SentenceTransformersTextEmbedder(model="sentence-transformers/all-MiniLM-L6-v2")
-    retriever = InMemoryEmbeddingRetriever(document_store)
+    if simulation_enabled():
+        text_embedder = SimulatedTextEmbedder()
+        generator = SimulatedGenerator()
+    else:
+        text_embedder = SentenceTransformersTextEmbedder(model="sentence-transformers/all-MiniLM-L6-v2")
+        generator = CachedOpenAIGenerator(model="gpt-3.5-turbo")
+    retriever = SnapshotEmbeddingRetriever(document_store)
     prompt_builder = PromptBuilder(template=_PROMPT_TEMPLATE)
-    generator = OpenAIGenerator(model="gpt-3.5-turbo")
 
     basic_rag_pipeline = Pipeline()
     basic_rag_pipeline.add_component("text_embedder", text_embedder)
@@ -129,7 +141,13 @@ if __name__ == "__main__":
         "text_embedder": {"text": dataset.question},
         "prompt_builder": {"question": dataset.question},
     }
-    metrics_results = eval_pipeline.run_evaluation(dataset, input_map)
+    # Pipelined: the pipeline runs in batched mode on chunks of questions, and the
+    # metrics of each chunk (LLM-based ones included) are computed while the next runs.
+    # Batched: each component runs once on the whole dataset (one embedding call for
+    # all the questions, one matrix product for all the retrievals)
+    metrics_results = eval_pipeline.run_evaluation(
+        dataset, input_map, batched=not PIPELINED_EVAL, pipelined=PIPELINED_EVAL
+    )
 
     # 5. Print the results
     # The results are stored in a dictionary-like object
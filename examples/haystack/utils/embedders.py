@@ -0,0 +1,193 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+from haystack import Document, component
+from loguru import logger
+
+Encoder = Callable[[List[str]], np.ndarray]
+
+# Batch sizes tried by the autotuning, in order
+BATCH_SIZES = [8, 16, 32, 64, 128, 256]
+# Each worker loads its own copy of the model: by default only a few are started, and
+# only for enough documents to pay for the loading
+DEFAULT_NUM_WORKERS = 2
+DOCUMENTS_PER_WORKER = 2000
+
+_encoder: Optional[Encoder] = None  # model of a worker process
+
+
+def load_encoder(model: str, normalize_embeddings: bool = False) -> Encoder:
+    from sentence_transformers import SentenceTransformer
+
+    st_model = SentenceTransformer(model, device="cpu")
+
+    def encode(texts: List[str]) -> np.ndarray:
+        return st_model.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=normalize_embeddings,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+
+    return encode
+
+
+def _threads_per_worker(num_workers: int) -> int:
+    # Each process gets its share of the cores, instead of every process using all
+    return max(1, (os.cpu_count() or 1) // num_workers)
+
+
+def _init_worker(model: str, normalize_embeddings: bool, num_threads: int):
+    global _encoder
+    import torch
+
+    torch.set_num_threads(num_threads)
+    _encoder = load_encoder(model, normalize_embeddings)
+
+
+def _encode_batches(batches: List[List[str]]) -> List[np.ndarray]:
+    return [_encoder(batch) for batch in batches]
+
+
+def autotune_batch_size(
+    encode: Encoder, texts: Sequence[str], batch_sizes: Sequence[int] = BATCH_SIZES
+) -> int:
+    """
+    The batch size with the best throughput when embedding `texts`.
+
+    Batch sizes are tried in increasing order, until the throughput stops improving by
+    more than 5%. Each try embeds one batch of texts evenly sampled from `texts`.
+    """
+    texts = list(texts)
+    encode(texts[:1])  # warm up
+    best_size, best_rate = batch_sizes[0], 0.0
+    for size in batch_sizes:
+        idx = np.linspace(0, len(texts) - 1, num=size).astype(int)
+        tic = perf_counter()
+        encode([texts[i] for i in idx])
+        rate = size / (perf_counter() - tic)
+        logger.debug(f"Batch size {size}: {rate:.1f} chunks/sec")
+        if rate <= best_rate * 1.05:
+            break
+        best_size, best_rate = size, rate
+        if size >= len(texts):
+            break
+    return best_size
+
+
+@component
+class FastDocumentEmbedder:
+    """
+    Sentence Transformers document embedder for CPU-only machines.
+
+    The documents are sorted by length before being batched, so that the texts of a
+    batch are padded to about the same length. The batch size is tuned on the documents
+    (see `autotune_batch_size`) unless set, and the batches are embedded by a pool of
+    `num_workers` processes. The batch size is tuned with the number of threads of a
+    worker, as the best batch size depends on it. The throughput (chunks/sec) of each
+    run is logged.
+
+    Args:
+        model (str): The Sentence Transformers model.
+        batch_size (Optional[int]): Number of documents per batch (default: autotuned).
+        num_workers (Optional[int]): Number of embedding processes (default: one per
+            `DOCUMENTS_PER_WORKER` documents, up to `DEFAULT_NUM_WORKERS` and the CPU
+            count; 1: embed in this process).
+        normalize_embeddings (bool): Scale the embeddings to unit length.
+    """
+
+    def __init__(
+        self,
+        model: str = "sentence-transformers/all-MiniLM-L6-v2",
+        batch_size: Optional[int] = None,
+        num_workers: Optional[int] = None,
+        normalize_embeddings: bool = False,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.normalize_embeddings = normalize_embeddings
+        self.encoder: Optional[Encoder] = None
+
+    def warm_up(self):
+        if self.encoder is None:
+            self.encoder = load_encoder(self.model, self.normalize_embeddings)
+
+    def _num_workers(self, num_documents: int) -> int:
+        if self.num_workers:
+            return self.num_workers
+        return max(
+            1,
+            min(
+                DEFAULT_NUM_WORKERS,
+                os.cpu_count() or 1,
+                num_documents // DOCUMENTS_PER_WORKER,
+            ),
+        )
+
+    def _pool(self, num_workers: int) -> ProcessPoolExecutor:
+        # Spawned (not forked) workers, torch is not fork-safe once a model is loaded
+        return ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(
+                self.model,
+                self.normalize_embeddings,
+                _threads_per_worker(num_workers),
+            ),
+        )
+
+    def _autotune(self, num_workers: int, texts: List[str]) -> int:
+        import torch
+
+        num_threads = torch.get_num_threads()
+        if num_workers > 1:
+            torch.set_num_threads(_threads_per_worker(num_workers))
+        try:
+            return autotune_batch_size(self.encoder, texts)
+        finally:
+            torch.set_num_threads(num_threads)
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        if not documents:
+            return {"documents": documents}
+        self.warm_up()
+        tic = perf_counter()
+        texts = [doc.content or "" for doc in documents]
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        num_workers = self._num_workers(len(documents))
+        batch_size = self.batch_size or self._autotune(
+            num_workers, [texts[i] for i in order]
+        )
+        batches = [
+            [texts[i] for i in order[start : start + batch_size]]
+            for start in range(0, len(order), batch_size)
+        ]
+        if num_workers > 1 and len(batches) > 1:
+            # A few tasks per worker, each with batches of all lengths to balance the load
+            num_tasks = min(len(batches), num_workers * 4)
+            tasks = [batches[i::num_tasks] for i in range(num_tasks)]
+            with self._pool(num_workers) as pool:
+                results = list(pool.map(_encode_batches, tasks))
+            embedded = [None] * len(batches)
+            for i, task_results in enumerate(results):
+                embedded[i::num_tasks] = task_results
+        else:
+            embedded = [self.encoder(batch) for batch in batches]
+        embeddings = np.concatenate(embedded)
+        for i, embedding in zip(order, embeddings):
+            documents[i].embedding = embedding.tolist()
+        elapsed = perf_counter() - tic
+        logger.info(
+            f"Embedded {len(documents)} chunks in {elapsed:.2f}s "
+            f"({len(documents) / elapsed:.1f} chunks/sec, batch size {batch_size}, "
+            f"{num_workers} workers)"
+        )
+        return {"documents": documents}
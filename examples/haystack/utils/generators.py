@@ -0,0 +1,42 @@
+from typing import Any, Callable, Dict, List, Optional
+
+from haystack import component
+from haystack.components.generators import OpenAIGenerator
+from haystack.dataclasses import StreamingChunk
+
+from examples.utils.cache import get_cache
+
+# Sampling temperature of the OpenAI API when none is set
+OPENAI_DEFAULT_TEMPERATURE = 1.0
+
+
+@component
+class CachedOpenAIGenerator(OpenAIGenerator):
+    """
+    Drop-in replacement of `OpenAIGenerator` that serves repeated prompts from the
+    persistent response cache.
+    """
+
+    @component.output_types(replies=List[str], meta=List[Dict[str, Any]])
+    def run(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        streaming_callback: Optional[Callable[[StreamingChunk], None]] = None,
+        generation_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        cache = get_cache()
+        generate = super().run
+        if cache is None or streaming_callback or self.streaming_callback:
+            return generate(prompt, system_prompt, streaming_callback, generation_kwargs)
+        return cache.call(
+            "openai",
+            self.model,
+            {
+                "temperature": OPENAI_DEFAULT_TEMPERATURE,
+                **self.generation_kwargs,
+                **(generation_kwargs or {}),
+            },
+            {"system_prompt": system_prompt or self.system_prompt, "prompt": prompt},
+            lambda: generate(prompt, system_prompt, streaming_callback, generation_kwargs),
+        )
@@ -1,15 +1,189 @@
-from typing import Any, Dict, List, Tuple
+import copy
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 import networkx as nx
 from continuous_eval.eval import Module
 from continuous_eval.eval import Pipeline as CEPipeline
-from continuous_eval.eval.dataset import Dataset, DatasetField
+from continuous_eval.eval.dataset import Dataset, DatasetField, LambdaField
 from continuous_eval.eval.logger import PipelineLogger
+from continuous_eval.eval.pipeline import ModuleOutput
 from continuous_eval.eval.result_types import MetricsResults
 from continuous_eval.eval.runner import EvaluationRunner
 from continuous_eval.eval.tests import Test
 from continuous_eval.metrics import Metric
 from haystack import Pipeline as HSPipeline
+from haystack.components.embedders import SentenceTransformersTextEmbedder
+from loguru import logger
+
+from examples.utils.online_eval import metric_kwargs
+
+BatchRunner = Callable[[Any, List[Dict[str, Any]]], List[Dict[str, Any]]]
+
+
+def _embed_texts(
+    embedder: SentenceTransformersTextEmbedder, inputs: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    # All the texts in one call of the model (batched forward passes)
+    embeddings = embedder.embedding_backend.embed(
+        [embedder.prefix + x["text"] + embedder.suffix for x in inputs],
+        batch_size=embedder.batch_size,
+        show_progress_bar=embedder.progress_bar,
+        normalize_embeddings=embedder.normalize_embeddings,
+        precision=embedder.precision,
+    )
+    return [{"embedding": embedding} for embedding in embeddings]
+
+
+# Batched versions of the `run` method of third-party components. Other components can
+# define a `run_batch(inputs)` method, the remaining ones are run concurrently
+BATCH_RUNNERS: Dict[type, BatchRunner] = {
+    SentenceTransformersTextEmbedder: _embed_texts,
+}
+
+
+class _KeyRecorder(dict):
+    # Module output recording the keys read by the selectors
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.keys_read: Set[str] = set()
+        self.read_all = False
+
+    def __getitem__(self, key):
+        self.keys_read.add(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.keys_read.add(key)
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        self.keys_read.add(key)
+        return super().__contains__(key)
+
+    def __iter__(self):
+        self.read_all = True
+        return super().__iter__()
+
+    def keys(self):
+        self.read_all = True
+        return super().keys()
+
+    def values(self):
+        self.read_all = True
+        return super().values()
+
+    def items(self):
+        self.read_all = True
+        return super().items()
+
+
+class OutputCapture:
+    """
+    The module outputs read by the metrics, and the part of them to log.
+
+    Only the modules read by a metric are logged: the modules of the `ModuleOutput`
+    parameters, the modules of the metrics without parameters or with a `LambdaField` (whole
+    output). Of their outputs, only the fields read by the selectors are kept, e.g. the
+    `replies` of a generator but not its `meta`. With `apply_selectors`, the selected values
+    are logged instead, and the metrics are rewritten to read them (see `module`).
+
+    Args:
+        modules (Dict[str, Module]): The modules of the pipeline, with their metrics.
+        apply_selectors (bool): Log the selected values instead of the module outputs.
+        capture_all (bool): Log every module output in full (no selection).
+    """
+
+    def __init__(
+        self,
+        modules: Dict[str, Module],
+        apply_selectors: bool = False,
+        capture_all: bool = False,
+    ):
+        self.apply_selectors = apply_selectors and not capture_all
+        # Selectors of each module output, `None` for the whole output
+        self.selectors: Dict[str, List[Optional[ModuleOutput]]] = dict()
+        if capture_all:
+            self.selectors = {name: [None] for name in modules}
+        for module in modules.values():
+            for metric in module.eval or []:
+                if metric.overloaded_params is None:
+                    self._add(module.name, None)
+                    continue
+                for val in metric.overloaded_params.values():
+                    if isinstance(val, ModuleOutput):
+                        self._add(self._module_name(module, val), val)
+                    elif isinstance(val, LambdaField):
+                        self._add(module.name, None)
+
+    @staticmethod
+    def _module_name(module: Module, val: ModuleOutput) -> str:
+        return getattr(
+            val.module, "name", val.module if isinstance(val.module, str) else module.name
+        )
+
+    def _add(self, module: str, selector: Optional[ModuleOutput]):
+        selectors = self.selectors.setdefault(module, list())
+        if selector is None or selector.selector is None:
+            selector = None
+        if all(s is not selector for s in selectors):
+            selectors.append(selector)
+
+    @property
+    def modules(self) -> List[str]:
+        return list(self.selectors)
+
+    def _selected(self, module: str) -> bool:
+        # The selected values are logged (all the readers of the module have a selector)
+        return self.apply_selectors and None not in self.selectors[module]
+
+    def value(self, module: str, output: Any) -> Any:
+        """The value to log for the `output` of `module`."""
+        selectors = self.selectors[module]
+        if self._selected(module):
+            return [selector(output) for selector in selectors]
+        if None in selectors or not isinstance(output, dict):
+            return output
+        recorder = _KeyRecorder(output)
+        try:
+            for selector in selectors:
+                selector(recorder)
+        except Exception:
+            return output  # reported by the evaluation
+        if recorder.read_all:
+            return output
+        return {key: output[key] for key in output if key in recorder.keys_read}
+
+    def module(self, module: Module) -> Module:
+        """`module`, with its metrics reading the logged values."""
+        if not self.apply_selectors or not module.eval:
+            return module
+        metrics = list()
+        for metric in module.eval:
+            params = metric.overloaded_params
+            if params is not None and any(
+                isinstance(val, ModuleOutput)
+                and self._selected(self._module_name(module, val))
+                for val in params.values()
+            ):
+                metric = copy.copy(metric).use(
+                    **{key: self._logged(module, val) for key, val in params.items()}
+                )
+            metrics.append(metric)
+        return replace(module, eval=metrics)
+
+    def _logged(self, module: Module, val: Any) -> Any:
+        if not isinstance(val, ModuleOutput):
+            return val
+        name = self._module_name(module, val)
+        if not self._selected(name):
+            return val
+        i = next(i for i, s in enumerate(self.selectors[name]) if s is val)
+        return ModuleOutput(selector=itemgetter(i), module=name)
 
 
 class PipelineEvaluator:
@@ -38,14 +212,6 @@ class PipelineEvaluator:
         self._haystack_pipeline = pipeline
         self._modules = self._p2p(pipeline)
 
-    # Rest of the code...
-
-
-class PipelineEvaluator:
-    def __init__(self, pipeline: HSPipeline):
-        self._haystack_pipeline = pipeline
-        self._modules = self._p2p(pipeline)
-
     def __getitem__(self, module_name):
         return self._modules[module_name]
 
@@ -144,23 +310,187 @@ class PipelineEvaluator:
         plog: PipelineLogger,
         dataset: Dataset,
         input_map: Dict[str, Dict[str, Any]],
+        capture: OutputCapture,
     ) -> PipelineLogger:
-        module_names = list(self._modules.keys())
         for datum in dataset.data:
-            data = {
-                module: {
+            self._run_datum(plog, datum, input_map, capture)
+        return plog
+
+    def _run_datum(
+        self,
+        plog: PipelineLogger,
+        datum: Dict[str, Any],
+        input_map: Dict[str, Dict[str, Any]],
+        capture: OutputCapture,
+    ):
+        data = {
+            module: {
+                key: datum[value.name] if isinstance(value, DatasetField) else value
+                for key, value in input_map[module].items()
+            }
+            for module in input_map
+        }
+        out = self._haystack_pipeline.run(
+            data, include_outputs_from=set(capture.modules)
+        )
+        for m in capture.modules:
+            plog.log(uid=datum["uid"], module=m, value=capture.value(m, out[m]))
+
+    def _run_pipelined(
+        self,
+        pipeline: CEPipeline,
+        plog: PipelineLogger,
+        dataset: Dataset,
+        input_map: Dict[str, Dict[str, Any]],
+        capture: OutputCapture,
+        chunk_size: int = 16,
+        max_workers: int = 8,
+        queue_size: int = 8,
+        eval_workers: int = 4,
+    ) -> MetricsResults:
+        # Producer: the pipeline, run in batched mode on consecutive chunks of the
+        # dataset. Consumers: the metrics of the completed data, computed while the next
+        # chunk runs. The queue is bounded, so the pipeline waits when the metrics fall
+        # behind
+        modules = [module for module in pipeline.modules if module.eval is not None]
+        samples: Dict[str, Dict[str, List[Any]]] = {
+            module.name: {metric.name: [None] * len(dataset.data) for metric in module.eval}
+            for module in modules
+        }
+        # Same check as `EvaluationRunner.evaluate`, nothing would be logged
+        assert (
+            dataset.data and capture.modules
+        ), "No evaluation samples to run the metrics on"
+        completed: queue.Queue = queue.Queue(maxsize=queue_size)
+        errors: List[Exception] = list()
+        failed = threading.Event()
+
+        def evaluate():
+            while (item := completed.get()) is not None:
+                if failed.is_set():
+                    continue  # keep draining, so that the producer never blocks
+                i, datum = item
+                try:
+                    record = {**datum, **plog.data[datum["uid"]]}
+                    for module in modules:
+                        for metric in module.eval:
+                            kwargs = metric_kwargs(module, metric, datum, record)
+                            samples[module.name][metric.name][i] = metric.compute(**kwargs)
+                except Exception as e:
+                    errors.append(e)
+                    failed.set()
+
+        def put(item) -> bool:
+            # Give up instead of waiting forever if all the consumers are gone
+            while any(worker.is_alive() for worker in workers):
+                try:
+                    completed.put(item, timeout=1.0)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        workers = [threading.Thread(target=evaluate) for _ in range(eval_workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            for start in range(0, len(dataset.data), chunk_size):
+                if failed.is_set():
+                    break
+                chunk = dataset.data[start : start + chunk_size]
+                self._run_pipeline_batched(plog, chunk, input_map, capture, max_workers)
+                if not all(put((i, datum)) for i, datum in enumerate(chunk, start)):
+                    raise RuntimeError("The evaluation workers stopped unexpectedly")
+        finally:
+            for _ in workers:
+                put(None)
+            for worker in workers:
+                worker.join()
+        if errors:
+            raise errors[0]
+        metrics_results = MetricsResults(pipeline)
+        metrics_results.samples = samples
+        return metrics_results
+
+    @staticmethod
+    def _run_component(
+        component: Any, inputs: List[Dict[str, Any]], max_workers: int
+    ) -> List[Dict[str, Any]]:
+        run_batch = getattr(component, "run_batch", None)
+        if run_batch is not None:
+            return run_batch(inputs)
+        if type(component) in BATCH_RUNNERS:
+            return BATCH_RUNNERS[type(component)](component, inputs)
+
+        def run(x: Dict[str, Any]):
+            try:
+                return component.run(**x)
+            except Exception as e:
+                return e
+
+        # Every item runs even if some fail, so that all the failures are reported
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            outputs = list(executor.map(run, inputs))
+        errors = [(i, e) for i, e in enumerate(outputs) if isinstance(e, Exception)]
+        for i, e in errors:
+            logger.error(f"{type(component).__name__} failed on datum {i}: {e}")
+        if errors:
+            raise errors[0][1]
+        return outputs
+
+    def _run_pipeline_batched(
+        self,
+        plog: PipelineLogger,
+        data: List[Dict[str, Any]],
+        input_map: Dict[str, Dict[str, Any]],
+        capture: OutputCapture,
+        max_workers: int = 8,
+    ) -> PipelineLogger:
+        # Each component runs once on all the data, in topological order
+        graph = self._haystack_pipeline.graph
+        self._haystack_pipeline.warm_up()
+        outputs: Dict[str, List[Dict[str, Any]]] = dict()
+        for name in nx.topological_sort(graph):
+            inputs = [
+                {
                     key: datum[value.name] if isinstance(value, DatasetField) else value
-                    for key, value in input_map[module].items()
+                    for key, value in input_map.get(name, {}).items()
                 }
-                for module in input_map
-            }
-            out = self._haystack_pipeline.run(data, include_outputs_from=module_names)
-            for m in module_names:
-                plog.log(uid=datum["uid"], module=m, value=out[m])
+                for datum in data
+            ]
+            for sender, _, edge in graph.in_edges(name, data=True):
+                to_socket = edge["to_socket"]
+                for x, out in zip(inputs, outputs[sender]):
+                    value = out[edge["from_socket"].name]
+                    if to_socket.is_variadic:
+                        x.setdefault(to_socket.name, list()).append(value)
+                    else:
+                        x[to_socket.name] = value
+            component = self._haystack_pipeline.get_component(name)
+            outputs[name] = self._run_component(component, inputs, max_workers)
+            # Outputs of the whole dataset are only kept while needed
+            for sender in graph.predecessors(name):
+                if sender not in capture.modules and all(
+                    receiver in outputs for receiver in graph.successors(sender)
+                ):
+                    outputs[sender] = list()
+        for i, datum in enumerate(data):
+            for m in capture.modules:
+                plog.log(uid=datum["uid"], module=m, value=capture.value(m, outputs[m][i]))
         return plog
 
     def run_evaluation(
-        self, dataset: Dataset, input_map: Dict[str, Dict[str, Any]]
+        self,
+        dataset: Dataset,
+        input_map: Dict[str, Dict[str, Any]],
+        batched: bool = False,
+        max_workers: int = 8,
+        pipelined: bool = False,
+        chunk_size: int = 16,
+        queue_size: int = 8,
+        eval_workers: int = 4,
+        apply_selectors: bool = False,
+        capture_all: bool = False,
     ) -> MetricsResults:
         """
         Run the evaluation for the given dataset.
@@ -168,13 +498,58 @@ class PipelineEvaluator:
         Args:
             dataset (Dataset): The dataset to evaluate.
             input_map (Dict[str, Dict[str, Any]]): A dictionary mapping modules' input names to input values.
+            batched (bool): Run each component once on the whole dataset instead of running the
+                pipeline once per datum. Components with a batched version (e.g. text embedders,
+                retrievers with a `run_batch` method) process all the data in one call, the others
+                are called concurrently (all the failed calls are logged, then the first error
+                is raised).
+            max_workers (int): Maximum number of concurrent calls of a component, in batched and
+                pipelined modes.
+            pipelined (bool): Run the pipeline in batched mode on consecutive chunks of the
+                dataset, and compute the metrics of each chunk while the next one runs, instead
+                of after the whole dataset. The wall time is about max(run, evaluation) instead
+                of their sum. Not compatible with `batched`.
+            chunk_size (int): Number of data per batched run of the pipeline, in pipelined mode.
+            queue_size (int): Maximum number of completed data waiting for their metrics, in
+                pipelined mode.
+            eval_workers (int): Number of threads computing the metrics, in pipelined mode.
+            apply_selectors (bool): Log the values selected by the metrics (`ModuleOutput`)
+                instead of the module outputs. By default only the modules and output fields
+                read by the metrics are logged (see `OutputCapture`).
+            capture_all (bool): Log the full output of every module.
 
         Returns:
             MetricsResults: The results of the evaluation.
         """
-        pipeline = CEPipeline(list(self._modules.values()))
+        capture = OutputCapture(self._modules, apply_selectors, capture_all)
+        pipeline = CEPipeline([capture.module(m) for m in self._modules.values()])
         pipeline.dataset = dataset  # trick to avoid dataset fields validation
         plog = PipelineLogger(pipeline=pipeline)
-        self._run_pipeline(plog=plog, dataset=dataset, input_map=input_map)
+        if pipelined:
+            if batched:
+                raise ValueError("Batched and pipelined modes are exclusive")
+            return self._run_pipelined(
+                pipeline,
+                plog,
+                dataset,
+                input_map,
+                capture,
+                chunk_size=chunk_size,
+                max_workers=max_workers,
+                queue_size=queue_size,
+                eval_workers=eval_workers,
+            )
+        if batched:
+            self._run_pipeline_batched(
+                plog=plog,
+                data=dataset.data,
+                input_map=input_map,
+                capture=capture,
+                max_workers=max_workers,
+            )
+        else:
+            self._run_pipeline(
+                plog=plog, dataset=dataset, input_map=input_map, capture=capture
+            )
         evalrunner = EvaluationRunner(pipeline)
         return evalrunner.evaluate(plog)
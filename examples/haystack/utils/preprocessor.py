@@ -1,23 +1,52 @@
+import os
 from pathlib import Path
+from typing import List
 
 from haystack import Pipeline
 from haystack.components.converters import TextFileToDocument
-from haystack.components.embedders import SentenceTransformersDocumentEmbedder
 from haystack.components.joiners import DocumentJoiner
 from haystack.components.preprocessors import DocumentCleaner, DocumentSplitter
 from haystack.components.writers import DocumentWriter
 from haystack.document_stores.in_memory import InMemoryDocumentStore
 
+from examples.haystack.utils.embedders import FastDocumentEmbedder
+from examples.haystack.utils.simulated import SimulatedDocumentEmbedder
+from examples.haystack.utils.snapshot import (
+    DocumentSnapshot,
+    snapshot_key,
+    write_snapshot,
+)
+from examples.utils.simulation import simulation_enabled
+
+SPLIT_BY = "sentence"
+SPLIT_LENGTH = 2
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Embedding processes (default: up to 2, for large corpora) and batch size (default:
+# autotuned)
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0")) or None
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "0")) or None
+
+
+def list_sources(doc_dir: Path) -> List[str]:
+    return sorted(
+        str(f) for f in doc_dir.iterdir() if f.is_file() and f.suffix in [".txt"]
+    )
+
 
 def preprocess_documents(doc_dir: Path):
     document_store = InMemoryDocumentStore()
     text_file_converter = TextFileToDocument()
     document_cleaner = DocumentCleaner()
     document_joiner = DocumentJoiner()
-    document_splitter = DocumentSplitter(split_by="sentence", split_length=2)
-    document_embedder = SentenceTransformersDocumentEmbedder(
-        model="sentence-transformers/all-MiniLM-L6-v2"
-    )
+    document_splitter = DocumentSplitter(split_by=SPLIT_BY, split_length=SPLIT_LENGTH)
+    if simulation_enabled():
+        document_embedder = SimulatedDocumentEmbedder()
+    else:
+        document_embedder = FastDocumentEmbedder(
+            model=EMBEDDING_MODEL,
+            batch_size=EMBED_BATCH_SIZE,
+            num_workers=EMBED_WORKERS,
+        )
     document_writer = DocumentWriter(document_store)
 
     preprocessing_pipeline = Pipeline()
@@ -45,8 +74,25 @@ def preprocess_documents(doc_dir: Path):
     preprocessing_pipeline.connect("document_splitter", "document_embedder")
     preprocessing_pipeline.connect("document_embedder", "document_writer")
 
-    sources = [
-        str(f) for f in doc_dir.iterdir() if f.is_file() and f.suffix in [".txt"]
-    ]
+    sources = list_sources(doc_dir)
     preprocessing_pipeline.run({"text_file_converter": {"sources": sources}})
     return document_store
+
+
+def load_documents(doc_dir: Path, snapshot_dir: Path) -> DocumentSnapshot:
+    """
+    The preprocessed documents of `doc_dir`, from a snapshot in `snapshot_dir`.
+
+    Snapshots are keyed by the content of the source files and the preprocessing
+    settings: the documents are only preprocessed when no snapshot matches.
+    """
+    settings = {
+        "split_by": SPLIT_BY,
+        "split_length": SPLIT_LENGTH,
+        "embedder": "simulated" if simulation_enabled() else EMBEDDING_MODEL,
+    }
+    key = snapshot_key(list_sources(doc_dir), settings)
+    path = snapshot_dir / key[:16]
+    if not DocumentSnapshot.is_fresh(path, key):
+        write_snapshot(preprocess_documents(doc_dir), path, key)
+    return DocumentSnapshot(path)
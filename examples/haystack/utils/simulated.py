@@ -0,0 +1,67 @@
+from typing import Any, Callable, Dict, List, Optional
+
+from haystack import Document, component
+from haystack.dataclasses import StreamingChunk
+
+from examples.utils.simulation import Simulator, fake_completion, fake_embedding
+
+# Haystack generator and embedders (see `examples.utils.simulation`)
+
+
+@component
+class SimulatedGenerator:
+    def __init__(self, model: str = "simulated"):
+        self.model = model
+        self.simulator = Simulator("openai")
+
+    @component.output_types(replies=List[str], meta=List[Dict[str, Any]])
+    def run(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        streaming_callback: Optional[Callable[[StreamingChunk], None]] = None,
+        generation_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        self.simulator()
+        reply = fake_completion(prompt)
+        meta = {
+            "model": self.model,
+            "finish_reason": "stop",
+            "usage": {
+                "prompt_tokens": len(prompt.split()),
+                "completion_tokens": len(reply.split()),
+            },
+        }
+        return {"replies": [reply], "meta": [meta]}
+
+
+@component
+class SimulatedTextEmbedder:
+    def __init__(self, dim: int = 384, batch_size: int = 32):
+        self.dim = dim
+        self.batch_size = batch_size
+        self.simulator = Simulator("embedder")
+
+    @component.output_types(embedding=List[float])
+    def run(self, text: str):
+        self.simulator()
+        return {"embedding": fake_embedding(text, self.dim)}
+
+    def run_batch(self, inputs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for _ in range(0, len(inputs), self.batch_size):
+            self.simulator()  # one forward pass per batch of texts
+        return [{"embedding": fake_embedding(x["text"], self.dim)} for x in inputs]
+
+
+@component
+class SimulatedDocumentEmbedder:
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.simulator = Simulator("embedder")
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        self.simulator()
+        for doc in documents:
+            doc.embedding = fake_embedding(doc.content or "", self.dim)
+        return {"documents": documents}
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import shutil
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from haystack import Document, component
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+from haystack.utils.filters import document_matches_filter
+
+from examples.utils.blobs import Blob, write_blob
+
+MANIFEST_FNAME = "manifest.json"
+SNAPSHOT_FORMAT = "snapshot-v1"
+
+
+def snapshot_key(sources: List[Union[str, Path]], settings: Dict[str, Any]) -> str:
+    """
+    Hash of the source files and of the preprocessing settings.
+
+    The files are keyed by their stats (path, size, modification time) rather than their
+    content, so that finding the snapshot does not read the whole corpus.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps({"format": SNAPSHOT_FORMAT, **settings}, sort_keys=True).encode())
+    for source in sorted(str(s) for s in sources):
+        stat = Path(source).stat()
+        h.update(source.encode("utf-8"))
+        h.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def write_snapshot(
+    document_store: InMemoryDocumentStore, path: Union[str, Path], key: str
+):
+    """Write the documents of `document_store` (with their embeddings) to `path`."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    documents = document_store.filter_documents()
+    assert all(
+        doc.embedding is not None for doc in documents
+    ), "Every document must be embedded before it is snapshotted"
+    np.save(tmp / "ids.npy", np.array([doc.id for doc in documents], dtype=str))
+    np.save(
+        tmp / "embeddings.npy",
+        np.array([doc.embedding for doc in documents], dtype=np.float32),
+    )
+    write_blob(tmp, "content", [doc.content or "" for doc in documents])
+    write_blob(tmp, "meta", [json.dumps(doc.meta, ensure_ascii=False) for doc in documents])
+    (tmp / MANIFEST_FNAME).write_text(
+        json.dumps({"key": key, "documents": len(documents)}, indent=2)
+    )
+    # Swap in the complete snapshot, so that an interrupted write is never loaded
+    shutil.rmtree(path, ignore_errors=True)
+    tmp.rename(path)
+
+
+class DocumentSnapshot:
+    """
+    Read-only snapshot of a document store, memory-mapped.
+
+    Document contents and metadata are stored as blobs with offsets, the embeddings as
+    a `float32` matrix. Processes loading the same snapshot share its pages instead of
+    holding their own copy, and only the retrieved documents are materialised.
+
+    Args:
+        path (Union[str, Path]): The directory written by `write_snapshot`.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.manifest = json.loads((self.path / MANIFEST_FNAME).read_text())
+        self.ids = np.load(self.path / "ids.npy", mmap_mode="r")
+        self.embeddings = np.load(self.path / "embeddings.npy", mmap_mode="r")
+        self.content = Blob(self.path, "content")
+        self.meta = Blob(self.path, "meta")
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def is_fresh(path: Union[str, Path], key: str) -> bool:
+        manifest = Path(path) / MANIFEST_FNAME
+        return manifest.exists() and json.loads(manifest.read_text())["key"] == key
+
+    def document(self, i: int, score: Optional[float] = None, embedding: bool = False):
+        return Document(
+            id=str(self.ids[i]),
+            content=self.content[i],
+            meta=json.loads(self.meta[i]),
+            score=score,
+            embedding=self.embeddings[i].tolist() if embedding else None,
+        )
+
+    @cached_property
+    def _filterable(self) -> List[Document]:
+        """Id and metadata of every document, decoded once, to evaluate the filters."""
+        return [
+            Document(id=str(self.ids[i]), meta=json.loads(self.meta[i]))
+            for i in range(len(self))
+        ]
+
+    def _top_k(
+        self, scores: np.ndarray, top_k: int, query: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        k = min(top_k, int(np.isfinite(scores).sum()))
+        if k == 0:
+            return np.zeros(0, dtype=int)
+        # All the documents tied with the k-th best score are candidates, so that ties
+        # are broken in document order (as the stable sort of `InMemoryDocumentStore`)
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        if query is None:
+            candidates = np.flatnonzero(scores >= kth)
+        else:
+            # The float32 scores can differ from the float64 ones of the document store
+            # in the last digits: the documents close to the k-th score are rescored
+            candidates = np.flatnonzero(scores >= kth - 1e-4 * max(1.0, abs(kth)))
+            scores[candidates] = self.embeddings[candidates].astype(np.float64) @ query
+        return candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+
+    def _documents(
+        self, scores: np.ndarray, top: np.ndarray, scale_score: bool, return_embedding: bool
+    ) -> List[Document]:
+        if scale_score:
+            scores = 1 / (1 + np.exp(-scores / 100))
+        return [
+            self.document(i, score=float(scores[i]), embedding=return_embedding)
+            for i in top
+        ]
+
+    def embedding_retrieval(
+        self,
+        query_embedding: List[float],
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: int = 10,
+        scale_score: bool = False,
+        return_embedding: bool = False,
+    ) -> List[Document]:
+        """
+        Same results as `InMemoryDocumentStore.embedding_retrieval` (dot product).
+
+        The filters can only refer to the id and metadata of the documents.
+        """
+        query = np.asarray(query_embedding, dtype=np.float64)
+        scores = (self.embeddings @ query.astype(np.float32)).astype(np.float64)
+        if filters:
+            mask = np.array(
+                [
+                    document_matches_filter(filters, document)
+                    for document in self._filterable
+                ],
+                dtype=bool,
+            )
+            scores = np.where(mask, scores, -np.inf)
+        top = self._top_k(scores, top_k, query)
+        return self._documents(scores, top, scale_score, return_embedding)
+
+    def batch_embedding_retrieval(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        scale_score: bool = False,
+        return_embedding: bool = False,
+    ) -> List[List[Document]]:
+        """
+        `embedding_retrieval` of several queries, scored by a single matrix product.
+
+        The scores can differ from `embedding_retrieval` in the last float32 digit (the
+        sums are not done in the same order), and so can the order of near ties.
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        scores = queries @ self.embeddings.T
+        return [
+            self._documents(row, self._top_k(row, top_k), scale_score, return_embedding)
+            for row in scores
+        ]
+
+
+@component
+class SnapshotEmbeddingRetriever:
+    """
+    Drop-in replacement of `InMemoryEmbeddingRetriever` for a `DocumentSnapshot`.
+
+    Args:
+        snapshot (DocumentSnapshot): The snapshot to search.
+        filters (Optional[Dict[str, Any]]): Filters on the document metadata.
+        top_k (int): Number of documents to retrieve.
+        scale_score (bool): Scale the scores to [0, 1].
+        return_embedding (bool): Return the embeddings of the documents.
+    """
+
+    def __init__(
+        self,
+        snapshot: DocumentSnapshot,
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: int = 10,
+        scale_score: bool = False,
+        return_embedding: bool = False,
+    ):
+        self.snapshot = snapshot
+        self.filters = filters
+        self.top_k = top_k
+        self.scale_score = scale_score
+        self.return_embedding = return_embedding
+
+    @component.output_types(documents=List[Document])
+    def run(
+        self,
+        query_embedding: List[float],
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: Optional[int] = None,
+        scale_score: Optional[bool] = None,
+        return_embedding: Optional[bool] = None,
+    ):
+        documents = self.snapshot.embedding_retrieval(
+            query_embedding=query_embedding,
+            filters=filters or self.filters,
+            top_k=top_k or self.top_k,
+            scale_score=self.scale_score if scale_score is None else scale_score,
+            return_embedding=(
+                self.return_embedding if return_embedding is None else return_embedding
+            ),
+        )
+        return {"documents": documents}
+
+    def run_batch(self, inputs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        `run` on several inputs (see `PipelineEvaluator.run_evaluation(batched=True)`).
+
+        All the queries are scored at once, unless some have filters or options.
+        """
+        if self.filters or any(set(x) != {"query_embedding"} for x in inputs):
+            return [self.run(**x) for x in inputs]
+        results = self.snapshot.batch_embedding_retrieval(
+            [x["query_embedding"] for x in inputs],
+            top_k=self.top_k,
+            scale_score=self.scale_score,
+            return_embedding=self.return_embedding,
+        )
+        return [{"documents": documents} for documents in results]
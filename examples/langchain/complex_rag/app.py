@@ -1,56 +1,88 @@
+import os
 from pathlib import Path
 
-from continuous_eval.eval.logger import PipelineLogger
 from dotenv import load_dotenv
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
 from langchain_cohere import CohereRerank
-from langchain_community.document_loaders.directory import DirectoryLoader
-from langchain_community.retrievers import BM25Retriever
 from langchain_openai import OpenAI, OpenAIEmbeddings
-from tenacity import retry, stop_after_attempt, wait_fixed
-from tqdm import tqdm
 
+from examples.langchain.complex_rag.bm25 import BM25IndexRetriever, get_bm25_index
 from examples.langchain.complex_rag.pipeline import pipeline
+from examples.langchain.simulated import (
+    SimulatedEmbeddings,
+    SimulatedLLM,
+    SimulatedReranker,
+)
+from examples.utils.cache import cached
+from examples.utils.chunks import ChunkTable
+from examples.utils.concurrency import max_concurrency, run_concurrently
+from examples.utils.dag import DagExecutor
+from examples.utils.embeddings import EmbeddingStore
+from examples.utils.fusion import reciprocal_rank_fusion
+from examples.utils.logger import StreamingPipelineLogger, resume_enabled
+from examples.utils.rate_limit import estimate_tokens, rate_limited
+from examples.utils.simulation import simulation_enabled
 
 load_dotenv()
 
-
-# Load documents and split
-loader = DirectoryLoader("data/paul_graham/documents/208_219_graham_essays")
-docs = loader.load()
-TextSplitter = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=0)
-split_docs = TextSplitter.split_documents(docs)
+# Number of fused documents sent to the reranker (default: all, without duplicates)
+FUSION_TOP_N = int(os.environ["FUSION_TOP_N"]) if os.getenv("FUSION_TOP_N") else None
+# Also the number of HyDE documents generated at the same time
+MAX_CONCURRENCY = max_concurrency()
+
+# Set up providers
+if simulation_enabled():
+    embeddings = SimulatedEmbeddings()
+    model = SimulatedLLM(temperature=0.7)
+    compressor = SimulatedReranker(top_n=3)
+else:
+    embeddings = OpenAIEmbeddings()
+    model = OpenAI()
+    compressor = CohereRerank(model="rerank-v3.5", top_n=3)
 
 # Set up Vectorstore
 db = Chroma(
     persist_directory=str("data/paul_graham/vectorstore/208_219_chroma_db"),
-    embedding_function=OpenAIEmbeddings(),
+    embedding_function=embeddings,
+)
+# Question and HyDE embeddings are cached next to the dataset
+query_embeddings = EmbeddingStore(
+    f"data/paul_graham/dataset/embeddings/{embeddings.model}.npz",
+    embed_documents=rate_limited(
+        "openai", count_tokens=lambda texts: estimate_tokens(*texts)
+    )(embeddings.embed_documents),
 )
 
-# Set up LLM
-model = OpenAI()
-basic_retriever = db.as_retriever(search_type="similarity", search_kwargs={"k": 3})
-bm25_retriever = BM25Retriever.from_documents(documents=split_docs)
-bm25_retriever.k = 3
-hyde_retriever = db.as_retriever(search_type="similarity", search_kwargs={"k": 3})
-compressor = CohereRerank(model="rerank-v3.5", top_n=3)
+# BM25 index of the split essays, persisted and rebuilt only when the corpus changes
+bm25_retriever = BM25IndexRetriever(index=get_bm25_index(), k=3)
 
 
 def base_retrieve(q):
-    return basic_retriever.invoke(q)
+    return db.similarity_search_by_vector(query_embeddings.get(q), k=3)
+
+
+# BM25 results precomputed for all the questions at once (see `bm25_retriever.batch_retrieve`)
+bm25_results = dict()
 
 
 def bm25_retrieve(q):
+    if q in bm25_results:
+        return bm25_results[q]
     return bm25_retriever.invoke(q)
 
 
+@cached("openai", model=model.model_name, params={"temperature": model.temperature})
+@rate_limited("openai", count_tokens=estimate_tokens)
+def generate(prompt):
+    return model.invoke(prompt)
+
+
 def hyde_generator(q):
     # HyDE generator
     system_prompt = "Generate a hypothetical document paragraph that contains an answer to the question below."
     user_prompt = f"Question: {q}\n\n"
     try:
-        result = model.invoke(system_prompt + user_prompt)
+        result = generate(system_prompt + user_prompt)
     except Exception as e:
         print(f"{e} unable to generate hypothetical document, using question as HyDE")
         result = q
@@ -59,10 +91,11 @@ def hyde_generator(q):
 
 def hyde_retrieve(hypothetical_doc):
     # HyDE retriever
-    return hyde_retriever.invoke(hypothetical_doc)
+    return db.similarity_search_by_vector(query_embeddings.get(hypothetical_doc), k=3)
 
 
-@retry(stop=stop_after_attempt(10), wait=wait_fixed(61))  # Free tier rate limit
+@cached("cohere", model=compressor.model, params={"top_n": compressor.top_n})
+@rate_limited("cohere")
 def rerank(q, retrieved_docs):
     return compressor.compress_documents(retrieved_docs, q)
 
@@ -75,56 +108,90 @@ def ask(q, retrieved_docs):
         f"Question: {q}\n\nContext:\n{ctx}"
     )
     try:
-        result = model.invoke(prompt)
+        result = generate(prompt)
     except Exception as e:
         print(e)
         result = "Sorry, I cannot answer this question."
     return result
 
 
-if __name__ == "__main__":
-    output_dir = Path("output")
-    output_dir.mkdir(exist_ok=True)
+# HyDE documents generated as a pre-stage, so that they are embedded in one batch
+hypothetical_docs = dict()
 
-    pipelog = PipelineLogger(pipeline=pipeline)
-    for datum in tqdm(pipeline.dataset.data):
-        q = datum["question"]
-        # Base Retriever
-        base_retrieved_docs = base_retrieve(q)
-        pipelog.log(
-            uid=datum["uid"],
-            module="base_retriever",
-            value=[doc.__dict__ for doc in base_retrieved_docs],
-        )
-        # BM25 Retriever
-        bm25_retrieved_docs = bm25_retrieve(q)
-        pipelog.log(
-            uid=datum["uid"],
-            module="bm25_retriever",
-            value=[doc.__dict__ for doc in bm25_retrieved_docs],
-        )
-        # HyDE Generator
-        hypothetical_doc = hyde_generator(q)
-        pipelog.log(uid=datum["uid"], module="HyDE_generator", value=hypothetical_doc)
-        # HyDE Retriever
-        hyde_retrieved_docs = hyde_retrieve(hypothetical_doc)
-        pipelog.log(
-            uid=datum["uid"],
-            module="HyDE_retriever",
-            value=[doc.__dict__ for doc in hyde_retrieved_docs],
+# App stages, scheduled following the module graph of the pipeline: the base, BM25
+# and HyDE branches run concurrently, their results are fused before the reranker
+stages = {
+    "base_retriever": lambda datum: base_retrieve(datum["question"]),
+    "bm25_retriever": lambda datum: bm25_retrieve(datum["question"]),
+    "HyDE_generator": lambda datum: hypothetical_docs[datum["uid"]],
+    "HyDE_retriever": lambda datum, HyDE_generator: hyde_retrieve(HyDE_generator),
+    "rank_fusion": lambda datum, base_retriever, bm25_retriever, HyDE_retriever: (
+        reciprocal_rank_fusion(
+            [base_retriever, bm25_retriever, HyDE_retriever], top_n=FUSION_TOP_N
         )
+    ),
+    "cohere_reranker": lambda datum, rank_fusion: rerank(datum["question"], rank_fusion),
+    "answer_generator": lambda datum, cohere_reranker: ask(
+        datum["question"], cohere_reranker
+    ),
+}
+# Stages returning documents, logged as references to the chunk table
+DOCUMENT_STAGES = {
+    "base_retriever",
+    "bm25_retriever",
+    "HyDE_retriever",
+    "rank_fusion",
+    "cohere_reranker",
+}
+
+
+def run(dag, pipelog, chunks, datum):
+    outputs = dag.run(datum)
+    for module, value in outputs.items():
+        if module in DOCUMENT_STAGES:
+            value = chunks.refs(value)
+        pipelog.log(uid=datum["uid"], module=module, value=value)
+    pipelog.complete(datum["uid"])
 
-        # Reranker
-        fused_docs = base_retrieved_docs + bm25_retrieved_docs + hyde_retrieved_docs
-        reranked_docs = rerank(q, fused_docs)
-        pipelog.log(
-            uid=datum["uid"],
-            module="cohere_reranker",
-            value=[doc.__dict__ for doc in reranked_docs],
-        )
 
-        # Generator
-        response = ask(q, reranked_docs)
-        pipelog.log(uid=datum["uid"], module="answer_generator", value=response)
+if __name__ == "__main__":
+    output_dir = Path("output")
+    output_dir.mkdir(exist_ok=True)
 
-    pipelog.save(output_dir / "langchain_complex_rag.jsonl")
+    # Retrieved chunks are stored once, the log only references them by id
+    with StreamingPipelineLogger(
+        pipeline,
+        output_dir / "langchain_complex_rag.jsonl",
+        resume=resume_enabled(),
+    ) as pipelog, ChunkTable(
+        output_dir / "langchain_complex_rag_chunks.jsonl", resume=resume_enabled()
+    ) as chunks:
+        data = pipelog.pending(pipeline.dataset.data)
+
+        # HyDE Generator (pre-stage, so that all the HyDE documents are embedded
+        # together with the questions, in a few batched requests)
+        questions = [datum["question"] for datum in data]
+        hypothetical_docs.update(
+            zip(
+                [datum["uid"] for datum in data],
+                run_concurrently(
+                    hyde_generator, questions, max_workers=MAX_CONCURRENCY, desc="HyDE"
+                ),
+            )
+        )
+        query_embeddings.embed(questions + list(hypothetical_docs.values()))
+        # Score all the questions against the BM25 index in one pass
+        bm25_results.update(zip(questions, bm25_retriever.batch_retrieve(questions)))
+
+        # Several questions at a time, so that the rerank and generation requests of
+        # one question overlap with the other questions
+        with DagExecutor(
+            pipeline, stages, max_workers=len(stages) * MAX_CONCURRENCY
+        ) as dag:
+            run_concurrently(
+                lambda datum: run(dag, pipelog, chunks, datum),
+                data,
+                max_workers=MAX_CONCURRENCY,
+            )
+
+    query_embeddings.save()
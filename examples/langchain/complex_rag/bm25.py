@@ -0,0 +1,281 @@
+import hashlib
+import json
+import shutil
+from functools import cached_property
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+import scipy.sparse as sp
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders.directory import DirectoryLoader
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from loguru import logger
+from pydantic import ConfigDict
+from rank_bm25 import BM25Okapi
+
+# Persisted BM25 index of the essays, so that the app does not load, split and index
+# the whole corpus at every run. Build it with:
+#   poetry run python -m examples.langchain.complex_rag.bm25
+# The index is a directory of `.npy` files (memory-mapped when loaded) keyed by the
+# hash of the corpus file stats and of the splitter settings: it is rebuilt only when
+# they change.
+# Scores and rankings are the same as `BM25Retriever` (`rank_bm25.BM25Okapi`).
+
+DOCUMENTS_DIR = Path("data/paul_graham/documents/208_219_graham_essays")
+INDEX_DIR = Path("data/paul_graham/bm25")
+CHUNK_SIZE = 400
+CHUNK_OVERLAP = 0
+
+
+def tokenize(text: str) -> List[str]:
+    # Same preprocessing as `BM25Retriever`
+    return text.split()
+
+
+def corpus_key(documents_dir: Union[str, Path], chunk_size: int, chunk_overlap: int):
+    # Keyed by the file stats (path, size, modification time) rather than the content,
+    # so that finding the index does not read the whole corpus
+    h = hashlib.sha256()
+    h.update(json.dumps([chunk_size, chunk_overlap]).encode("utf-8"))
+    for path in sorted(Path(documents_dir).rglob("*")):
+        if path.is_file():
+            stat = path.stat()
+            h.update(str(path.relative_to(documents_dir)).encode("utf-8"))
+            h.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def split_documents(
+    documents_dir: Union[str, Path], chunk_size: int, chunk_overlap: int
+) -> List[Document]:
+    docs = DirectoryLoader(str(documents_dir)).load()
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+    return splitter.split_documents(docs)
+
+
+def build_bm25_index(
+    documents: List[Document],
+    path: Union[str, Path],
+    meta: Optional[dict] = None,
+    k1: float = 1.5,
+    b: float = 0.75,
+    epsilon: float = 0.25,
+):
+    """Index `documents` and write the BM25 statistics to the directory `path`."""
+    path = Path(path)
+    corpus = [tokenize(doc.page_content) for doc in documents]
+    bm25 = BM25Okapi(corpus, k1=k1, b=b, epsilon=epsilon)
+    vocab = sorted(bm25.idf)
+    term_ids = {term: i for i, term in enumerate(vocab)}
+    # Postings (term -> documents containing it), as a CSR term-document matrix
+    postings = [[] for _ in vocab]
+    for doc_id, frequencies in enumerate(bm25.doc_freqs):
+        for term, tf in frequencies.items():
+            postings[term_ids[term]].append((doc_id, tf))
+    ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    ptr[1:] = np.cumsum([len(p) for p in postings])
+    flat = [x for p in postings for x in p]
+    chunks = [
+        json.dumps(
+            {"page_content": doc.page_content, "metadata": doc.metadata},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        for doc in documents
+    ]
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(c) for c in chunks])
+
+    # Write to a temporary directory first, so that an interrupted build is never loaded
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    np.save(tmp / "vocab.npy", np.array(vocab, dtype=str))
+    np.save(tmp / "idf.npy", np.array([bm25.idf[t] for t in vocab], dtype=np.float64))
+    np.save(tmp / "postings_ptr.npy", ptr)
+    np.save(tmp / "postings_doc.npy", np.array([d for d, _ in flat], dtype=np.int32))
+    np.save(tmp / "postings_tf.npy", np.array([tf for _, tf in flat], dtype=np.int32))
+    np.save(tmp / "doc_len.npy", np.array(bm25.doc_len, dtype=np.int32))
+    np.save(tmp / "chunk_offsets.npy", offsets)
+    (tmp / "chunks.bin").write_bytes(b"".join(chunks))
+    (tmp / "meta.json").write_text(
+        json.dumps(
+            {
+                **(meta or {}),
+                "k1": k1,
+                "b": b,
+                "epsilon": epsilon,
+                "avgdl": bm25.avgdl,
+                "corpus_size": bm25.corpus_size,
+            },
+            indent=2,
+        )
+    )
+    shutil.rmtree(path, ignore_errors=True)
+    tmp.rename(path)
+
+
+class BM25Index:
+    """
+    A BM25 index written by `build_bm25_index`, memory-mapped from disk.
+
+    Args:
+        path (Union[str, Path]): The index directory.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        meta = json.loads((self.path / "meta.json").read_text())
+        self.k1, self.b, self.avgdl = meta["k1"], meta["b"], meta["avgdl"]
+        self.corpus_size = meta["corpus_size"]
+
+        def load(name):
+            return np.load(self.path / f"{name}.npy", mmap_mode="r")
+
+        self.vocab = load("vocab")
+        self.idf = load("idf")
+        self.postings_ptr = load("postings_ptr")
+        self.postings_doc = load("postings_doc")
+        self.postings_tf = load("postings_tf")
+        self.doc_len = load("doc_len")
+        self.chunk_offsets = load("chunk_offsets")
+        self.chunks = np.memmap(self.path / "chunks.bin", dtype=np.uint8, mode="r")
+
+    def __len__(self):
+        return self.corpus_size
+
+    def term_id(self, term: str) -> Optional[int]:
+        i = int(np.searchsorted(self.vocab, term))
+        if i < len(self.vocab) and self.vocab[i] == term:
+            return i
+        return None
+
+    def scores(self, query: str) -> np.ndarray:
+        score = np.zeros(self.corpus_size)
+        for term in tokenize(query):
+            t = self.term_id(term)
+            if t is None:
+                continue
+            lo, hi = self.postings_ptr[t], self.postings_ptr[t + 1]
+            docs = self.postings_doc[lo:hi]
+            q_freq = self.postings_tf[lo:hi].astype(np.float64)
+            doc_len = self.doc_len[docs]
+            score[docs] += self.idf[t] * (
+                q_freq
+                * (self.k1 + 1)
+                / (q_freq + self.k1 * (1 - self.b + self.b * doc_len / self.avgdl))
+            )
+        return score
+
+    def top_k(self, query: str, k: int) -> List[int]:
+        return np.argsort(self.scores(query))[::-1][:k].tolist()
+
+    @cached_property
+    def weights(self) -> sp.csr_matrix:
+        """The term-document matrix of the BM25 weights (computed on first use)."""
+        terms = np.repeat(np.arange(len(self.vocab)), np.diff(self.postings_ptr))
+        q_freq = np.asarray(self.postings_tf, dtype=np.float64)
+        doc_len = self.doc_len[self.postings_doc]
+        data = self.idf[terms] * (
+            q_freq
+            * (self.k1 + 1)
+            / (q_freq + self.k1 * (1 - self.b + self.b * doc_len / self.avgdl))
+        )
+        return sp.csr_matrix(
+            (data, self.postings_doc, self.postings_ptr),
+            shape=(len(self.vocab), self.corpus_size),
+        )
+
+    def query_matrix(self, queries: List[str]) -> sp.csr_matrix:
+        """Term counts of each query (unknown terms are dropped)."""
+        rows, cols = [], []
+        for i, query in enumerate(queries):
+            for term in tokenize(query):
+                t = self.term_id(term)
+                if t is not None:
+                    rows.append(i)
+                    cols.append(t)
+        counts = np.ones(len(rows), dtype=np.float64)
+        # duplicate (row, col) entries are summed, as repeated terms are scored twice
+        return sp.csr_matrix(
+            (counts, (rows, cols)), shape=(len(queries), len(self.vocab))
+        )
+
+    def batch_top_k(
+        self, queries: List[str], k: int, batch_size: int = 1024
+    ) -> List[List[int]]:
+        """Top `k` documents of every query, scored with sparse matrix products."""
+        results = []
+        for i in range(0, len(queries), batch_size):
+            queries_batch = self.query_matrix(queries[i : i + batch_size])
+            # Sparse scores: only the documents sharing a term with the query
+            scores = (queries_batch @ self.weights).tocsr()
+            n = min(k, self.corpus_size)
+            for r in range(scores.shape[0]):
+                lo, hi = scores.indptr[r], scores.indptr[r + 1]
+                docs, values = scores.indices[lo:hi], scores.data[lo:hi]
+                # Documents scoring 0, in case fewer than `n` match (the last ones
+                # are enough, as ties are ranked by decreasing document index)
+                start = max(0, self.corpus_size - n - len(docs))
+                zeros = np.setdiff1d(np.arange(start, self.corpus_size), docs)
+                candidates = np.concatenate([docs, zeros])
+                row = np.concatenate([values, np.zeros(len(zeros))])
+                # Equal scores are ranked by decreasing document index (`top_k`
+                # breaks them arbitrarily, as `np.argsort` is not stable)
+                order = np.lexsort((-candidates, -row))[:n]
+                results.append(candidates[order].tolist())
+        return results
+
+    def document(self, doc_id: int) -> Document:
+        lo, hi = self.chunk_offsets[doc_id], self.chunk_offsets[doc_id + 1]
+        return Document(**json.loads(self.chunks[lo:hi].tobytes().decode("utf-8")))
+
+    def documents(self, doc_ids: List[int]) -> List[Document]:
+        return [self.document(i) for i in doc_ids]
+
+
+def get_bm25_index(
+    documents_dir: Union[str, Path] = DOCUMENTS_DIR,
+    index_dir: Union[str, Path] = INDEX_DIR,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+) -> BM25Index:
+    """Load the BM25 index of `documents_dir`, building it if the corpus or the settings changed."""
+    key = corpus_key(documents_dir, chunk_size, chunk_overlap)
+    path = Path(index_dir) / key
+    if not (path / "meta.json").exists():
+        logger.info(f"Building BM25 index of {documents_dir} in {path}")
+        documents = split_documents(documents_dir, chunk_size, chunk_overlap)
+        meta = {"key": key, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+        build_bm25_index(documents, path, meta=meta)
+    return BM25Index(path)
+
+
+class BM25IndexRetriever(BaseRetriever):
+    """Drop-in replacement of `BM25Retriever` backed by a persisted `BM25Index`."""
+
+    index: BM25Index
+    k: int = 4
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.index.documents(self.index.top_k(query, self.k))
+
+    def batch_retrieve(self, queries: List[str]) -> List[List[Document]]:
+        """Retrieve the documents of all the `queries` at once (see `BM25Index.batch_top_k`)."""
+        return [
+            self.index.documents(doc_ids)
+            for doc_ids in self.index.batch_top_k(queries, self.k)
+        ]
+
+
+if __name__ == "__main__":
+    index = get_bm25_index()
+    print(f"BM25 index: {index.path} ({len(index)} chunks)")
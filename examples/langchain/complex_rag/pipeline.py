@@ -17,12 +17,14 @@ from continuous_eval.metrics.retrieval import (
     RankedRetrievalMetrics,
 )
 
+from examples.utils.chunks import resolve_documents
+
 
 Documents = List[Dict[str, str]]
 
 
 def get_documents_content(x: Documents) -> List[str]:
-    return [z["page_content"] for z in x]
+    return [z["page_content"] for z in resolve_documents(x)]
 
 
 DocumentsContent = ModuleOutput(get_documents_content)
@@ -99,9 +101,25 @@ hyde_retriever = Module(
 )
 
 
+rank_fusion = Module(
+    name="rank_fusion",
+    input=(base_retriever, hyde_retriever, bm25_retriever),
+    output=Documents,
+    eval=[
+        PrecisionRecallF1().use(
+            retrieved_context=DocumentsContent,
+            ground_truth_context=dataset.ground_truth_context,
+        ),
+        RankedRetrievalMetrics().use(
+            retrieved_context=DocumentsContent,
+            ground_truth_context=dataset.ground_truth_context,
+        ),
+    ],
+)
+
 reranker = Module(
     name="cohere_reranker",
-    input=(base_retriever, hyde_retriever, bm25_retriever),
+    input=rank_fusion,
     output=Documents,
     eval=[
         PrecisionRecallF1().use(
@@ -156,7 +174,15 @@ llm = Module(
 )
 
 pipeline = Pipeline(
-    [base_retriever, hyde_generator, hyde_retriever, bm25_retriever, reranker, llm],
+    [
+        base_retriever,
+        hyde_generator,
+        hyde_retriever,
+        bm25_retriever,
+        rank_fusion,
+        reranker,
+        llm,
+    ],
     dataset=dataset,
 )
 
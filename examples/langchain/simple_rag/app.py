@@ -1,36 +1,70 @@
 import os
 from pathlib import Path
 
-from continuous_eval.eval.logger import PipelineLogger
 from dotenv import load_dotenv
 from langchain_chroma import Chroma
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_openai import OpenAIEmbeddings
-from tenacity import retry, stop_after_attempt, wait_fixed
-from tqdm import tqdm
 from examples.langchain.simple_rag.pipeline import pipeline
+from examples.langchain.simulated import (
+    SimulatedChatModel,
+    SimulatedEmbeddings,
+    SimulatedReranker,
+)
+from examples.utils.concurrency import max_concurrency, run_concurrently
+from examples.utils.cache import cached
+from examples.utils.chunks import ChunkTable
+from examples.utils.embeddings import EmbeddingStore
+from examples.utils.logger import StreamingPipelineLogger, resume_enabled
+from examples.utils.online_eval import OnlineEvaluator
+from examples.utils.rate_limit import estimate_tokens, rate_limited
+from examples.utils.simulation import simulation_enabled
 from langchain_cohere import CohereRerank
 
 load_dotenv()
 
+MAX_CONCURRENCY = max_concurrency()
+# Number of samples between two live summaries of the metrics (0 = only at the end)
+ONLINE_EVAL_EVERY = int(os.getenv("ONLINE_EVAL_EVERY", "10"))
+
+if simulation_enabled():
+    embeddings = SimulatedEmbeddings()
+    compressor = SimulatedReranker(top_n=3)
+    model = SimulatedChatModel(temperature=1.0)
+else:
+    embeddings = OpenAIEmbeddings()
+    compressor = CohereRerank(model="rerank-v3.5", top_n=3)
+    model = ChatGoogleGenerativeAI(model="gemini-pro", temperature=1.0)
+
 db = Chroma(
     persist_directory=str("data/paul_graham/vectorstore/208_219_chroma_db"),
-    embedding_function=OpenAIEmbeddings(),
+    embedding_function=embeddings,
+)
+# Query embeddings are precomputed in batches and stored next to the dataset
+query_embeddings = EmbeddingStore(
+    f"data/paul_graham/dataset/embeddings/{embeddings.model}.npz",
+    embed_documents=rate_limited(
+        "openai", count_tokens=lambda texts: estimate_tokens(*texts)
+    )(embeddings.embed_documents),
 )
-retriever = db.as_retriever(search_type="similarity", search_kwargs={"k": 10})
-compressor = CohereRerank(model="rerank-v3.5", top_n=3)
-model = ChatGoogleGenerativeAI(model="gemini-pro", temperature=1.0)
 
 
 def retrieve(q):
-    return retriever.invoke(q)
+    return db.similarity_search_by_vector(query_embeddings.get(q), k=10)
 
 
-@retry(stop=stop_after_attempt(10), wait=wait_fixed(61))  # Free tier rate limit
+@cached("cohere", model=compressor.model, params={"top_n": compressor.top_n})
+@rate_limited("cohere")
 def rerank(q, retrieved_docs):
     return compressor.compress_documents(retrieved_docs, q)
 
 
+@cached("google", model=model.model, params={"temperature": model.temperature})
+@rate_limited("google", count_tokens=estimate_tokens)
+def generate(prompt):
+    return model.invoke(prompt).content
+
+
 def ask(q, retrieved_docs):
     system_prompt = (
         "You are and expert of the life of Paul Graham.\n"
@@ -41,36 +75,61 @@ def ask(q, retrieved_docs):
         [doc.page_content for doc in retrieved_docs]
     )
     try:
-        result = model.invoke(system_prompt + user_prompt).content
+        result = generate(system_prompt + user_prompt)
     except Exception as e:
         print(e)
         result = "Sorry, I cannot answer this question."
     return result
 
 
+def run(pipelog, chunks, datum):
+    q = datum["question"]
+    # Retriever results
+    retrieved_docs = retrieve(q)
+    pipelog.log(
+        uid=datum["uid"],
+        module="retriever",
+        value=chunks.refs(retrieved_docs),
+    )
+    # Reranker
+    reranked_docs = rerank(q, retrieved_docs)
+    pipelog.log(
+        uid=datum["uid"],
+        module="reranker",
+        value=chunks.refs(reranked_docs),
+    )
+    # Generator
+    response = ask(q, reranked_docs)
+    pipelog.log(uid=datum["uid"], module="llm", value=response)
+    pipelog.complete(datum["uid"])
+
+
 if __name__ == "__main__":
     output_dir = Path("output")
     output_dir.mkdir(exist_ok=True)
 
-    pipelog = PipelineLogger(pipeline=pipeline)
-    for datum in tqdm(pipeline.dataset.data):
-        q = datum["question"]
-        # Retriever results
-        retrieved_docs = retrieve(q)
-        pipelog.log(
-            uid=datum["uid"],
-            module="retriever",
-            value=[doc.__dict__ for doc in retrieved_docs],
-        )
-        # Reranker
-        reranked_docs = rerank(q, retrieved_docs)
-        pipelog.log(
-            uid=datum["uid"],
-            module="reranker",
-            value=[doc.__dict__ for doc in reranked_docs],
-        )
-        # Generator
-        response = ask(q, reranked_docs)
-        pipelog.log(uid=datum["uid"], module="llm", value=response)
+    # Retrieved chunks are stored once, the log only references them by id. Cheap
+    # metrics are updated as the samples complete
+    with ChunkTable(
+        output_dir / "langchain_simple_rag_chunks.jsonl", resume=resume_enabled()
+    ) as chunks, StreamingPipelineLogger(
+        pipeline,
+        output_dir / "langchain_simple_rag.jsonl",
+        resume=resume_enabled(),
+        on_complete=(
+            evaluator := OnlineEvaluator(
+                pipeline, report_every=ONLINE_EVAL_EVERY, chunks=chunks
+            )
+        ).add,
+    ) as pipelog:
+        data = pipelog.pending(pipeline.dataset.data)
+
+        # Embed all the questions with a few batched requests
+        query_embeddings.embed([datum["question"] for datum in data])
 
-    pipelog.save(output_dir / "langchain_simple_rag.jsonl")
+        run_concurrently(
+            lambda datum: run(pipelog, chunks, datum),
+            data,
+            max_workers=MAX_CONCURRENCY,
+        )
+    evaluator.print_summary()
@@ -4,11 +4,13 @@ from continuous_eval.eval.logger import PipelineLogger
 from continuous_eval.eval.runner import EvaluationRunner
 from examples.common import print_metric_results, print_test_results
 from examples.langchain.simple_rag.pipeline import pipeline
+from examples.utils.chunks import load_chunks
 
 if __name__ == "__main__":
     output_dir = Path("output")
 
     pipelog = PipelineLogger(pipeline=pipeline)
+    load_chunks(output_dir / "langchain_simple_rag_chunks.jsonl")
     pipelog.load(output_dir / "langchain_simple_rag.jsonl")
 
     # Run the evaluation...
@@ -8,11 +8,13 @@ from continuous_eval.metrics.generation.text import (
 )
 from continuous_eval.metrics.retrieval import PrecisionRecallF1, RankedRetrievalMetrics
 
+from examples.utils.chunks import resolve_documents
+
 Documents = List[Dict[str, str]]
 
 
 def get_documents_content(x: Documents) -> List[str]:
-    return [z["page_content"] for z in x]
+    return [z["page_content"] for z in resolve_documents(x)]
 
 
 DocumentsContent = ModuleOutput(get_documents_content)
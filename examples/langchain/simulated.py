@@ -0,0 +1,106 @@
+from typing import Any, List, Optional, Sequence
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel, LLM
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import ConfigDict, Field
+
+from examples.utils.simulation import (
+    Simulator,
+    fake_completion,
+    fake_embedding,
+    fake_relevance,
+)
+
+# LangChain chat model, LLM, embeddings and reranker (see `examples.utils.simulation`)
+
+
+class SimulatedChatModel(BaseChatModel):
+    model: str = "simulated"
+    temperature: float = 0.0
+    simulator: Simulator = Field(default_factory=lambda: Simulator("google"))
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "simulated-chat"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self.simulator()
+        prompt = "\n".join(str(m.content) for m in messages)
+        message = AIMessage(content=fake_completion(prompt))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class SimulatedLLM(LLM):
+    model_name: str = "simulated"
+    temperature: float = 0.0
+    simulator: Simulator = Field(default_factory=lambda: Simulator("openai"))
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "simulated-llm"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> str:
+        self.simulator()
+        return fake_completion(prompt)
+
+
+class SimulatedEmbeddings(Embeddings):
+    def __init__(self, dim: int = 1536, model: str = "simulated"):
+        self.dim = dim
+        self.model = model
+        self.simulator = Simulator("openai")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.simulator()  # one request per batch
+        return [fake_embedding(t, self.dim) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class SimulatedReranker(BaseDocumentCompressor):
+    model: str = "simulated"
+    top_n: int = 3
+    simulator: Simulator = Field(default_factory=lambda: Simulator("cohere"))
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        self.simulator()
+        scored = sorted(
+            ((fake_relevance(query, doc.page_content), doc) for doc in documents),
+            key=lambda x: x[0],
+            reverse=True,
+        )
+        return [
+            Document(
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "relevance_score": score},
+            )
+            for score, doc in scored[: self.top_n]
+        ]
@@ -1,12 +1,19 @@
+import json
+import os
 from pathlib import Path
-from typing import Literal
+from typing import List, Literal, Optional
 
-from continuous_eval.eval.logger import PipelineLogger
 from llama_index.core.program import LLMTextCompletionProgram
-from pydantic import BaseModel
+from loguru import logger
+from pydantic import BaseModel, ValidationError, field_validator
 from tqdm import tqdm
 
 from examples.llama_index.classification.pipeline import pipeline
+from examples.llama_index.utils.llms import CachedOpenAI
+from examples.llama_index.utils.simulated import SimulatedLLM
+from examples.utils.logger import StreamingPipelineLogger, resume_enabled
+from examples.utils.online_eval import OnlineEvaluator
+from examples.utils.simulation import simulation_enabled
 
 
 class SentimentAnalysis(BaseModel):
@@ -18,22 +25,102 @@ class SentimentAnalysis(BaseModel):
 prompt_template_str = """Given the title of a news article, say if the the article express a "positive", "negative" or "neutral" sentiment. 
 Title: "{title}"
 Sentiment: """
+llm = SimulatedLLM() if simulation_enabled() else CachedOpenAI()
 sentiment_analysis = LLMTextCompletionProgram.from_defaults(
     output_cls=SentimentAnalysis,
     prompt_template_str=prompt_template_str,
+    llm=llm,
     verbose=False,
 )
 
 
+class BatchSentimentAnalysis(BaseModel):
+    """Sentiments of a list of news article titles, in the same order as the titles."""
+
+    sentiments: List[Optional[SentimentAnalysis]]
+
+    @field_validator("sentiments", mode="before")
+    @classmethod
+    def drop_malformed(cls, items):
+        # A malformed item is replaced by None (its title is classified on its own)
+        if not isinstance(items, list):
+            return items
+        valid = list()
+        for item in items:
+            try:
+                valid.append(SentimentAnalysis.model_validate(item))
+            except ValidationError:
+                valid.append(None)
+        return valid
+
+
+batch_prompt_template_str = """Given the numbered titles of news articles, say for each title if the article express a "positive", "negative" or "neutral" sentiment. Give exactly one sentiment per title, in the same order as the titles.
+Titles:
+{titles}
+Sentiments: """
+batch_sentiment_analysis = LLMTextCompletionProgram.from_defaults(
+    output_cls=BatchSentimentAnalysis,
+    prompt_template_str=batch_prompt_template_str,
+    llm=llm,
+    verbose=False,
+)
+
+# Number of titles classified by a single request (1 = one request per title)
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "16"))
+# Number of samples between two live summaries of the metrics (0 = only at the end)
+ONLINE_EVAL_EVERY = int(os.getenv("ONLINE_EVAL_EVERY", "10"))
+
+
+def classify(titles: List[str]) -> List[str]:
+    """
+    Sentiments of `titles`, in one request.
+
+    If the results cannot be matched with the titles (e.g. some are missing), or for the
+    malformed results, the titles are classified one by one.
+    """
+    if len(titles) == 1:
+        return [sentiment_analysis(title=titles[0]).sentiment]
+    results = [None] * len(titles)
+    try:
+        numbered = "\n".join(f"{i}. {json.dumps(t)}" for i, t in enumerate(titles, 1))
+        output = batch_sentiment_analysis(titles=numbered)
+        if len(output.sentiments) == len(titles):
+            results = output.sentiments
+        else:
+            logger.warning(
+                f"Got {len(output.sentiments)} sentiments for {len(titles)} titles"
+            )
+    except (ValueError, ValidationError) as e:
+        logger.warning(f"Malformed batch output: {e}")
+    fallback = [i for i, result in enumerate(results) if result is None]
+    if fallback:
+        logger.info(f"Classifying {len(fallback)} titles one by one")
+    for i in fallback:
+        results[i] = sentiment_analysis(title=titles[i])
+    return [result.sentiment for result in results]
+
+
 if __name__ == "__main__":
     output_dir = Path("output")
     output_dir.mkdir(exist_ok=True)
 
-    pipelog = PipelineLogger(pipeline=pipeline)
-    for datum in tqdm(pipelog.pipeline.dataset.data):
-        title = datum["title"]
-        # Retriever
-        sentiment = sentiment_analysis(title=title).sentiment
-        pipelog.log(uid=datum["uid"], module="sentiment_analysis", value=sentiment)
-
-    pipelog.save(output_dir / "llamaindex_classification.jsonl")
+    # Metrics are updated as the samples complete
+    evaluator = OnlineEvaluator(pipeline, report_every=ONLINE_EVAL_EVERY)
+    with StreamingPipelineLogger(
+        pipeline,
+        output_dir / "llamaindex_classification.jsonl",
+        resume=resume_enabled(),
+        on_complete=evaluator.add,
+    ) as pipelog:
+        pending = pipelog.pending(pipelog.pipeline.dataset.data)
+        batches = [
+            pending[i : i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)
+        ]
+        for batch in tqdm(batches):
+            sentiments = classify([datum["title"] for datum in batch])
+            for datum, sentiment in zip(batch, sentiments):
+                pipelog.log(
+                    uid=datum["uid"], module="sentiment_analysis", value=sentiment
+                )
+                pipelog.complete(datum["uid"])
+    evaluator.print_summary()
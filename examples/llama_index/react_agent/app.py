@@ -1,28 +1,67 @@
+import functools
+import os
+import re
+import threading
+from contextvars import ContextVar
 from pathlib import Path
-from time import perf_counter
-from typing import Any
-
-from continuous_eval.eval.logger import PipelineLogger
-from llama_index.core import (
-    SimpleDirectoryReader,
-    StorageContext,
-    VectorStoreIndex,
-    load_index_from_storage,
-)
+from typing import Any, List, Optional
+
+from llama_index.core import Settings
 from llama_index.core.agent import ReActAgent
+from llama_index.core.callbacks import CallbackManager
 from llama_index.core.tools import QueryEngineTool as _QueryEngineTool
 from llama_index.core.tools import ToolMetadata, ToolOutput
-from llama_index.llms.openai import OpenAI
 from loguru import logger
-from tqdm import tqdm
 
 from examples.llama_index.react_agent.pipeline import pipeline
+from examples.llama_index.utils.indexes import IndexCache
+from examples.llama_index.utils.llms import CachedOpenAI
+from examples.llama_index.utils.simulated import SimulatedEmbedding, SimulatedLLM
+from examples.llama_index.utils.trace import ReActTraceHandler
+from examples.utils.cache import MemoryCache, make_key
+from examples.utils.concurrency import max_concurrency, run_concurrently
+from examples.utils.logger import StreamingPipelineLogger, resume_enabled
+from examples.utils.simulation import simulation_enabled
+
+output_dir = Path("output")
+out_fname = output_dir / "llamaindex_react_agent.jsonl"
+# Log of the run, opened when the app runs (so that importing it leaves the file alone)
+pipelog: Optional[StreamingPipelineLogger] = None
+# uid of the question being answered, set by each worker before running its agent
+current_uid: ContextVar[Any] = ContextVar("current_uid", default=None)
+
+MAX_CONCURRENCY = max_concurrency()
+
+# Reasoning steps of the agents (LLM and tool latency, tokens), per question. Set before
+# the LLMs and query engines are created so that they all report to it
+trace = ReActTraceHandler(key=current_uid.get)
+Settings.callback_manager = CallbackManager([trace])
+
+if simulation_enabled():
+    # Indexes are kept apart, since they are built with simulated embeddings
+    llm = agent_llm = Settings.llm = SimulatedLLM()
+    Settings.embed_model = SimulatedEmbedding()
+    vectorstore_dir = Path("output/simulated/uber_vectorstore")
+else:
+    llm = CachedOpenAI(model="gpt-4o-mini")
+    agent_llm = CachedOpenAI(model="gpt-4o-mini")
+    Settings.llm = CachedOpenAI()  # used by the query engines to synthesize answers
+    vectorstore_dir = Path("data/uber/index")
+
+# Tool results are reused across agent iterations and questions
+# (`TOOL_CACHE_SIZE=0` disables the cache)
+tool_cache = MemoryCache(
+    max_size=int(os.getenv("TOOL_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("TOOL_CACHE_TTL", "3600")),
+)
 
-pipelog = PipelineLogger(pipeline=pipeline)
-curr_uid = None
 
-llm = OpenAI(model="gpt-4o-mini")
-agent_llm = OpenAI(model="gpt-4o-mini")
+def normalise(value: Any) -> Any:
+    # Tool inputs differing only by case, spacing or punctuation share a cache entry
+    if isinstance(value, str):
+        return " ".join(re.findall(r"\w+", value.lower()))
+    return value
+
 
 # We extend Llama-index logger to allow logging
 class QueryEngineTool(_QueryEngineTool):
@@ -30,110 +69,127 @@ class QueryEngineTool(_QueryEngineTool):
         logger.info(
             f"Calling {self.metadata.name} with args: {args} and kwargs: {kwargs}"
         )
-        # We log the agent use first...
+        key = make_key(
+            "tool",
+            self.metadata.name,
+            None,
+            {
+                "args": [normalise(x) for x in args],
+                "kwargs": {k: normalise(v) for k, v in kwargs.items()},
+            },
+        )
+        hit, ret = tool_cache.get(key)
+        # We log the agent use first (cached calls are logged as well)...
+        uid = current_uid.get()
         pipelog.log(
-            uid=curr_uid,
+            uid=uid,
             module="retriever_agent",
             value=self.metadata.name,
-            tool_args=kwargs,
+            tool_args={**kwargs, "cache_hit": hit},
         )
-        # ...then call the tool...
-        ret = super().call(*args, **kwargs)
-        # ...and finally log its response
-        pipelog.log(uid=curr_uid, module="retriever_agent", value=ret.content)
+        # ...then call the tool (its response is recorded in the trace)
+        if not hit:
+            ret = super().call(*args, **kwargs)
+            tool_cache.set(key, ret)
         # retr_docs = [doc.node.text for doc in ret.raw_output.source_nodes]
         return ret
 
 
+@functools.lru_cache(maxsize=None)
+def get_tools() -> List[QueryEngineTool]:
+    """
+    The query engine tools of the agent, over the index of all the quarters.
 
-try:
-    # load indexes
-    march_index = load_index_from_storage(
-        StorageContext.from_defaults(persist_dir="data/uber/vectorstore/march")
-    )
-    june_index = load_index_from_storage(
-        StorageContext.from_defaults(persist_dir="data/uber/vectorstore/june")
-    )
-    sept_index = load_index_from_storage(
-        StorageContext.from_defaults(persist_dir="data/uber/vectorstore/sept")
-    )
-    print("Indexes loaded...")
-except Exception:
-    # build indexes across the three data sources
-    print("Building indexes...")
-    tic = perf_counter()
-    # build index
-    march_index = VectorStoreIndex.from_documents(
-        SimpleDirectoryReader(
-            input_files=["data/uber/uber_10q_march_2022.pdf"]
-        ).load_data()
-    )
-    june_index = VectorStoreIndex.from_documents(
-        SimpleDirectoryReader(
-            input_files=["data/uber/uber_10q_june_2022.pdf"]
-        ).load_data()
-    )
-    sept_index = VectorStoreIndex.from_documents(
-        SimpleDirectoryReader(
-            input_files=["data/uber/uber_10q_sept_2022.pdf"]
-        ).load_data()
-    )
-    # save index for later use
-    march_index.storage_context.persist(persist_dir="data/uber/vectorstore/march")
-    june_index.storage_context.persist(persist_dir="data/uber/vectorstore/june")
-    sept_index.storage_context.persist(persist_dir="data/uber/vectorstore/sept")
-    toc = perf_counter()
-    print(f"Indexes built, took {toc - tic:0.4f} seconds.")
-
-# Define tools
-query_engine_tools = [
-    QueryEngineTool(
-        query_engine=march_index.as_query_engine(similarity_top_k=3),
-        metadata=ToolMetadata(
-            name="uber_march_2022",
-            description=(
-                "Provides information about Uber quarterly financials ending March 2022"
+    Only the per-quarter indexes whose filing or settings changed are rebuilt (then
+    merged again). The build parses the PDFs in worker processes, so it must not run at
+    import time: call this from `__main__` before starting the agents.
+    """
+    index = IndexCache(
+        vectorstore_dir,
+        sources={
+            "march": "data/uber/uber_10q_march_2022.pdf",
+            "june": "data/uber/uber_10q_june_2022.pdf",
+            "sept": "data/uber/uber_10q_sept_2022.pdf",
+        },
+    ).get()
+
+    # Each tool searches the nodes of its quarter only
+    return [
+        QueryEngineTool(
+            query_engine=index.as_query_engine(
+                similarity_top_k=3, partitions=["march"]
+            ),
+            metadata=ToolMetadata(
+                name="uber_march_2022",
+                description=(
+                    "Provides information about Uber quarterly financials ending March 2022"
+                ),
             ),
         ),
-    ),
-    QueryEngineTool(
-        query_engine=june_index.as_query_engine(similarity_top_k=3),
-        metadata=ToolMetadata(
-            name="uber_june_2022",
-            description=(
-                "Provides information about Uber quarterly financials ending June 2021"
+        QueryEngineTool(
+            query_engine=index.as_query_engine(
+                similarity_top_k=3, partitions=["june"]
+            ),
+            metadata=ToolMetadata(
+                name="uber_june_2022",
+                description=(
+                    "Provides information about Uber quarterly financials ending June 2021"
+                ),
             ),
         ),
-    ),
-    QueryEngineTool(
-        query_engine=sept_index.as_query_engine(similarity_top_k=3),
-        metadata=ToolMetadata(
-            name="uber_sept_2022",
-            description=(
-                "Provides information about Uber quarterly financials ending Sept 2021"
+        QueryEngineTool(
+            query_engine=index.as_query_engine(
+                similarity_top_k=3, partitions=["sept"]
+            ),
+            metadata=ToolMetadata(
+                name="uber_sept_2022",
+                description=(
+                    "Provides information about Uber quarterly financials ending Sept 2021"
+                ),
             ),
         ),
-    ),
-]
+    ]
+
 
 # Define agent
-agent = ReActAgent.from_tools(
-    query_engine_tools, llm=agent_llm, verbose=True, max_iterations=20
-)
+def make_agent() -> ReActAgent:
+    return ReActAgent.from_tools(
+        get_tools(),
+        llm=agent_llm,
+        callback_manager=Settings.callback_manager,
+        verbose=MAX_CONCURRENCY <= 1,  # the traces of concurrent agents interleave
+        max_iterations=20,
+    )
+
+
+_workers = threading.local()
+
+
+def run(datum):
+    # Each worker thread has its own agent, reset before every question
+    if not hasattr(_workers, "agent"):
+        _workers.agent = make_agent()
+    _workers.agent.reset()
+    current_uid.set(datum["uid"])
+    response = _workers.agent.chat(datum["question"])
+    steps = trace.pop(datum["uid"])
+    pipelog.log(uid=datum["uid"], module="retriever_agent", value=steps)
+    pipelog.log(uid=datum["uid"], module="answer", value=response.response)
+    pipelog.complete(datum["uid"])
 
 
 if __name__ == "__main__":
     # agent.chat("Analyze the changes in R&D expenditures and revenue")
-    output_dir = Path("output")
-    output_dir.mkdir(exist_ok=True)
-
+    get_tools()  # load (or build) the indexes before starting the agents
     print("Running pipeline...")
-    for datum in tqdm(pipelog.pipeline.dataset.data):
-        curr_uid = datum["uid"]  # set the global variable
-        response = agent.chat(datum["question"])
-        pipelog.log(uid=curr_uid, module="answer", value=response.response)
-
-    out_fname = output_dir / "llamaindex_react_agent.jsonl"
-    pipelog.save(out_fname)
+    with StreamingPipelineLogger(
+        pipeline, out_fname, resume=resume_enabled()
+    ) as pipelog:
+        run_concurrently(
+            run,
+            pipelog.pending(pipelog.pipeline.dataset.data),
+            max_workers=MAX_CONCURRENCY,
+        )
     print("Pipeline run completed.")
+    print(f"Tool cache: {tool_cache.hits} hits, {tool_cache.misses} misses")
     print(f"Results saved to {out_fname}")
@@ -1,3 +1,5 @@
+from typing import Any, Dict
+
 from continuous_eval.eval import (
     CalledTools,
     Dataset,
@@ -33,7 +35,7 @@ tools = [
 agent = Module(
     name="retriever_agent",
     input=dataset.question,
-    output=str,
+    output=Dict[str, Any],  # reasoning steps and their summary (see `ReActTraceHandler`)
     eval=[
         ToolSelectionAccuracy().use(
             tools=CalledTools(), ground_truths=dataset.tool_calls
@@ -0,0 +1,120 @@
+import hashlib
+import json
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Union
+
+from llama_index.core import Settings, VectorStoreIndex
+from loguru import logger
+
+from examples.llama_index.utils.ingestion import build_indexes
+from examples.llama_index.utils.mmap_store import (
+    MMAP_FILES,
+    PARTITION_FILES,
+    MmapIndex,
+    merge_indexes,
+)
+
+MANIFEST_FNAME = "manifest.json"
+STORE_FORMAT = "mmap-v1"
+# Directory of the index merging all the sources
+COMBINED_DIR = "_combined"
+
+
+def file_hash(path: Union[str, Path]) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class IndexCache:
+    """
+    One persisted index (`MmapIndex`) per source file, rebuilt only when it is stale.
+
+    Each index is stored in `root/<name>` with a manifest recording the hash of the source
+    file, the embedding model and the chunking settings. An index is stale when the
+    manifest does not match the current settings or when a store file is missing.
+
+    The indexes are merged in `root/_combined`, a single index whose nodes are partitioned
+    by source name, merged again whenever one of the indexes changes.
+
+    Args:
+        root (Union[str, Path]): The directory containing the persisted indexes.
+        sources (Dict[str, Union[str, Path]]): The source file of each index, by name.
+    """
+
+    def __init__(self, root: Union[str, Path], sources: Dict[str, Union[str, Path]]):
+        self.root = Path(root)
+        self.sources = {name: Path(path) for name, path in sources.items()}
+
+    def manifest(self, name: str) -> Dict[str, Any]:
+        """The manifest an up to date index of `name` must have."""
+        return {
+            "format": STORE_FORMAT,
+            "source": str(self.sources[name]),
+            "source_sha256": file_hash(self.sources[name]),
+            "embed_model": Settings.embed_model.model_name,
+            "chunk_size": Settings.chunk_size,
+            "chunk_overlap": Settings.chunk_overlap,
+        }
+
+    def is_fresh(
+        self, name: str, manifest: Optional[Dict[str, Any]] = None, files=MMAP_FILES
+    ) -> bool:
+        persist_dir = self.root / name
+        if not all((persist_dir / f).exists() for f in files + [MANIFEST_FNAME]):
+            return False
+        persisted = json.loads((persist_dir / MANIFEST_FNAME).read_text())
+        return persisted == (manifest or self.manifest(name))
+
+    def stale(self) -> List[str]:
+        return [name for name in self.sources if not self.is_fresh(name)]
+
+    def load(self, name: str) -> MmapIndex:
+        return MmapIndex(self.root / name)
+
+    def build(self, names: List[str]):
+        """Build (in one pass) and persist the indexes of `names`."""
+        indexes = build_indexes({name: self.sources[name] for name in names})
+        for name, index in indexes.items():
+            self.persist(name, index)
+
+    def persist(self, name: str, index: VectorStoreIndex):
+        persist_dir = self.root / name
+        # Drop the manifest first, so that an interrupted write is never seen as fresh
+        (persist_dir / MANIFEST_FNAME).unlink(missing_ok=True)
+        MmapIndex.write(index, persist_dir)
+        (persist_dir / MANIFEST_FNAME).write_text(
+            json.dumps(self.manifest(name), indent=2)
+        )
+
+    def combined_manifest(self) -> Dict[str, Any]:
+        """The manifest an up to date combined index must have."""
+        return {
+            "format": STORE_FORMAT,
+            "sources": {name: self.manifest(name) for name in self.sources},
+        }
+
+    def combine(self, manifest: Dict[str, Any]):
+        persist_dir = self.root / COMBINED_DIR
+        (persist_dir / MANIFEST_FNAME).unlink(missing_ok=True)
+        merge_indexes({name: self.root / name for name in self.sources}, persist_dir)
+        (persist_dir / MANIFEST_FNAME).write_text(json.dumps(manifest, indent=2))
+
+    def get(self) -> MmapIndex:
+        """Load the combined index, building the stale indexes and merging them."""
+        stale = self.stale()
+        if stale:
+            logger.info(f"Building indexes: {stale}")
+            tic = perf_counter()
+            self.build(stale)
+            logger.info(f"Indexes built, took {perf_counter() - tic:0.4f} seconds.")
+        manifest = self.combined_manifest()
+        if stale or not self.is_fresh(
+            COMBINED_DIR, manifest, files=MMAP_FILES + PARTITION_FILES
+        ):
+            logger.info(f"Merging indexes: {list(self.sources)}")
+            self.combine(manifest)
+        return self.load(COMBINED_DIR)
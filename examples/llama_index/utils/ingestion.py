@@ -0,0 +1,124 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import pypdf
+from llama_index.core import Document, Settings, StorageContext, VectorStoreIndex
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.readers.file.base import default_file_metadata_func
+from llama_index.core.schema import BaseNode, MetadataMode
+from loguru import logger
+from tqdm import tqdm
+
+# Metadata kept out of the embedding and LLM content, as `SimpleDirectoryReader` does
+_EXCLUDED_METADATA = [
+    "file_name",
+    "file_type",
+    "file_size",
+    "creation_date",
+    "last_modified_date",
+    "last_accessed_date",
+]
+
+PageTask = Tuple[str, int, int]
+
+
+def _extract_pages(task: PageTask) -> List[Tuple[str, str]]:
+    # Runs in a worker process: (page label, text) of the pages [start, stop)
+    path, start, stop = task
+    pdf = pypdf.PdfReader(path)
+    return [(pdf.page_labels[i], pdf.pages[i].extract_text()) for i in range(start, stop)]
+
+
+def _page_document(path: str, label: str, text: str, file_metadata: dict) -> Document:
+    # Same document as `SimpleDirectoryReader` + `PDFReader` (one per page)
+    metadata = {"page_label": label, "file_name": Path(path).name, **file_metadata}
+    return Document(
+        text=text,
+        metadata=metadata,
+        excluded_embed_metadata_keys=list(_EXCLUDED_METADATA),
+        excluded_llm_metadata_keys=list(_EXCLUDED_METADATA),
+    )
+
+
+def build_indexes(
+    sources: Dict[str, Union[str, Path]],
+    max_workers: Optional[int] = None,
+    pages_per_task: int = 4,
+    embed_workers: int = 4,
+    embed_batch_size: Optional[int] = None,
+) -> Dict[str, VectorStoreIndex]:
+    """
+    Build a `VectorStoreIndex` for each PDF in `sources`, all in one pass.
+
+    Pages are parsed in parallel in a process pool (`pages_per_task` pages per task). As
+    pages are parsed, they are split into nodes with `Settings.transformations` and the
+    nodes are embedded in batches by `embed_workers` concurrent requests.
+
+    Args:
+        sources (Dict[str, Union[str, Path]]): The PDF file of each index, by name.
+        max_workers (Optional[int]): Number of parsing processes (default: CPU count).
+        pages_per_task (int): Number of pages parsed by a single task.
+        embed_workers (int): Number of embedding requests running at the same time.
+        embed_batch_size (Optional[int]): Number of nodes embedded by a single request
+            (default: the `embed_batch_size` of `Settings.embed_model`).
+
+    Returns:
+        Dict[str, VectorStoreIndex]: The indexes, by name.
+    """
+    embed_model = Settings.embed_model
+    embed_batch_size = embed_batch_size or embed_model.embed_batch_size
+    tasks: Dict[PageTask, str] = dict()
+    file_metadata = dict()
+    for name, path in sources.items():
+        path = str(path)
+        file_metadata[path] = default_file_metadata_func(path)
+        num_pages = len(pypdf.PdfReader(path).pages)
+        for start in range(0, num_pages, pages_per_task):
+            tasks[(path, start, min(start + pages_per_task, num_pages))] = name
+
+    documents: Dict[str, Dict[int, Document]] = {name: dict() for name in sources}
+    nodes: Dict[str, Dict[int, List[BaseNode]]] = {name: dict() for name in sources}
+    pending: List[BaseNode] = list()
+    embeddings = []
+
+    def embed(batch: List[BaseNode]):
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+        for node, embedding in zip(batch, embed_model.get_text_embedding_batch(texts)):
+            node.embedding = embedding
+
+    workers = max_workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as parser, ThreadPoolExecutor(
+        max_workers=embed_workers
+    ) as embedder:
+        futures = {parser.submit(_extract_pages, task): task for task in tasks}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Parsing"):
+            path, start, _ = task = futures[future]
+            name = tasks[task]
+            for i, (label, text) in enumerate(future.result(), start=start):
+                doc = _page_document(path, label, text, file_metadata[path])
+                documents[name][i] = doc
+                nodes[name][i] = run_transformations([doc], Settings.transformations)
+                pending.extend(nodes[name][i])
+            # Embed while the remaining pages are being parsed
+            while len(pending) >= embed_batch_size:
+                embeddings.append(embedder.submit(embed, pending[:embed_batch_size]))
+                del pending[:embed_batch_size]
+        if pending:
+            embeddings.append(embedder.submit(embed, pending))
+        for future in tqdm(as_completed(embeddings), total=len(embeddings), desc="Embedding"):
+            future.result()
+
+    indexes = dict()
+    for name in sources:
+        storage_context = StorageContext.from_defaults()
+        for i in sorted(documents[name]):
+            doc = documents[name][i]
+            storage_context.docstore.set_document_hash(doc.get_doc_id(), doc.hash)
+        index_nodes = [node for i in sorted(nodes[name]) for node in nodes[name][i]]
+        indexes[name] = VectorStoreIndex(
+            nodes=index_nodes, storage_context=storage_context
+        )
+        logger.info(f"Index {name}: {len(documents[name])} pages, {len(index_nodes)} nodes")
+    return indexes
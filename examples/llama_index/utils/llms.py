@@ -0,0 +1,55 @@
+from typing import Any, Sequence
+
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    CompletionResponse,
+)
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+from llama_index.llms.openai import OpenAI
+
+from examples.utils.cache import get_cache
+
+
+class CachedOpenAI(OpenAI):
+    """
+    OpenAI LLM whose chat and completion responses go through the persistent response cache.
+
+    Cached responses are reported to the callback handlers as well.
+    """
+
+    def _params(self, **kwargs: Any):
+        return {
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            **self.additional_kwargs,
+            **kwargs,
+        }
+
+    @llm_chat_callback()
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        cache, chat = get_cache(), super().chat
+        if cache is None:
+            return chat(messages, **kwargs)
+        return cache.call(
+            "openai",
+            self.model,
+            self._params(**kwargs),
+            [m.model_dump() for m in messages],
+            lambda: chat(messages, **kwargs),
+        )
+
+    @llm_completion_callback()
+    def complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponse:
+        cache, complete = get_cache(), super().complete
+        if cache is None:
+            return complete(prompt, formatted=formatted, **kwargs)
+        return cache.call(
+            "openai",
+            self.model,
+            self._params(formatted=formatted, **kwargs),
+            prompt,
+            lambda: complete(prompt, formatted=formatted, **kwargs),
+        )
@@ -0,0 +1,198 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from llama_index.core import QueryBundle, Settings, VectorStoreIndex
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import (
+    NodeRelationship,
+    NodeWithScore,
+    RelatedNodeInfo,
+    TextNode,
+)
+
+from examples.utils.blobs import Blob, merge_blobs, write_blob
+
+# Files of an index persisted with `MmapIndex.write`
+MMAP_FILES = [
+    "node_ids.npy",
+    "text.bin",
+    "text_offsets.npy",
+    "metadata.bin",
+    "metadata_offsets.npy",
+    "embeddings.npy",
+    "norms.npy",
+]
+
+
+# Partition (e.g. filing) of each node, in indexes written by `merge_indexes`
+PARTITION_FILES = ["partitions.npy", "partition_names.json"]
+
+
+def merge_indexes(paths: Dict[str, Union[str, Path]], out: Union[str, Path]):
+    """
+    Write a single index with the nodes of the `MmapIndex` in `paths`.
+
+    The nodes of each index are tagged with its name (their partition), so that searches
+    can be restricted to some partitions (see `MmapIndex.search`).
+    """
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    names = list(paths)
+    dirs = [Path(paths[name]) for name in names]
+    for column in ["node_ids", "embeddings", "norms"]:
+        np.save(
+            out / f"{column}.npy",
+            np.concatenate([np.load(d / f"{column}.npy", mmap_mode="r") for d in dirs]),
+        )
+    for blob in ["text", "metadata"]:
+        merge_blobs(dirs, out, blob)
+    sizes = [len(np.load(d / "node_ids.npy", mmap_mode="r")) for d in dirs]
+    np.save(out / "partitions.npy", np.repeat(np.arange(len(names), dtype=np.int16), sizes))
+    (out / "partition_names.json").write_text(json.dumps(names))
+
+
+class MmapIndex:
+    """
+    A vector index persisted in a binary, column-oriented format and memory-mapped.
+
+    Node texts and metadata are stored as blobs with offsets, the embeddings as a
+    `float32` matrix. Nothing is parsed when the index is loaded: only the nodes
+    returned by a search are materialised. Indexes written by `merge_indexes` also have
+    a partition column, used to restrict a search to some partitions with a mask.
+
+    Args:
+        path (Union[str, Path]): The directory written by `MmapIndex.write`.
+        embed_model (Optional[BaseEmbedding]): The model embedding the queries
+            (default: `Settings.embed_model`).
+    """
+
+    def __init__(
+        self, path: Union[str, Path], embed_model: Optional[BaseEmbedding] = None
+    ):
+        self.path = Path(path)
+        self.embed_model = embed_model or Settings.embed_model
+        self.node_ids = np.load(self.path / "node_ids.npy", mmap_mode="r")
+        self.embeddings = np.load(self.path / "embeddings.npy", mmap_mode="r")
+        self.norms = np.load(self.path / "norms.npy", mmap_mode="r")
+        self.text = Blob(self.path, "text")
+        self.metadata = Blob(self.path, "metadata")
+        self.partitions, self.partition_names = None, []
+        if (self.path / "partitions.npy").exists():
+            self.partitions = np.load(self.path / "partitions.npy", mmap_mode="r")
+            self.partition_names = json.loads(
+                (self.path / "partition_names.json").read_text()
+            )
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @staticmethod
+    def write(index: VectorStoreIndex, path: Union[str, Path]):
+        """Write the nodes and embeddings of a `VectorStoreIndex` to the directory `path`."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        node_ids = list(index.index_struct.nodes_dict.values())
+        nodes = index.docstore.get_nodes(node_ids)
+        embeddings = np.array(
+            [index.vector_store.get(node_id) for node_id in node_ids], dtype=np.float32
+        )
+        np.save(path / "node_ids.npy", np.array(node_ids, dtype=str))
+        np.save(path / "embeddings.npy", embeddings)
+        np.save(path / "norms.npy", np.linalg.norm(embeddings, axis=1))
+        write_blob(path, "text", [node.get_content() for node in nodes])
+        write_blob(
+            path,
+            "metadata",
+            [
+                json.dumps(
+                    {
+                        "metadata": node.metadata,
+                        "excluded_embed_metadata_keys": node.excluded_embed_metadata_keys,
+                        "excluded_llm_metadata_keys": node.excluded_llm_metadata_keys,
+                        "ref_doc_id": node.ref_doc_id,
+                    },
+                    ensure_ascii=False,
+                )
+                for node in nodes
+            ],
+        )
+
+    def node(self, i: int) -> TextNode:
+        info = json.loads(self.metadata[i])
+        ref_doc_id = info.pop("ref_doc_id")
+        relationships = dict()
+        if ref_doc_id is not None:
+            relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=ref_doc_id)
+        return TextNode(
+            id_=str(self.node_ids[i]),
+            text=self.text[i],
+            relationships=relationships,
+            **info,
+        )
+
+    def search(
+        self,
+        query_embedding: List[float],
+        k: int,
+        partitions: Optional[List[str]] = None,
+    ) -> List[NodeWithScore]:
+        """The `k` nodes most similar (cosine) to `query_embedding`, in `partitions` if set."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scores = (self.embeddings @ query) / (self.norms * np.linalg.norm(query))
+        if partitions is not None:
+            codes = [self.partition_names.index(p) for p in partitions]
+            scores[~np.isin(self.partitions, codes)] = -np.inf
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [NodeWithScore(node=self.node(i), score=float(scores[i])) for i in top]
+
+    def as_retriever(
+        self, similarity_top_k: int = 2, partitions: Optional[List[str]] = None
+    ) -> "MmapRetriever":
+        return MmapRetriever(
+            self, similarity_top_k=similarity_top_k, partitions=partitions
+        )
+
+    def as_query_engine(
+        self,
+        similarity_top_k: int = 2,
+        partitions: Optional[List[str]] = None,
+        **kwargs: Any,
+    ):
+        retriever = self.as_retriever(
+            similarity_top_k=similarity_top_k, partitions=partitions
+        )
+        return RetrieverQueryEngine.from_args(retriever, **kwargs)
+
+
+class MmapRetriever(BaseRetriever):
+    """Retriever over a `MmapIndex`, optionally restricted to some of its partitions."""
+
+    def __init__(
+        self,
+        index: MmapIndex,
+        similarity_top_k: int = 2,
+        partitions: Optional[List[str]] = None,
+        **kwargs: Any,
+    ):
+        self.index = index
+        self.similarity_top_k = similarity_top_k
+        self.partitions = partitions
+        kwargs.setdefault("callback_manager", Settings.callback_manager)
+        super().__init__(**kwargs)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self.index.embed_model.get_agg_embedding_from_queries(
+                query_bundle.embedding_strs
+            )
+        return self.index.search(
+            query_bundle.embedding, self.similarity_top_k, partitions=self.partitions
+        )
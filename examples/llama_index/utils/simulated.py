@@ -0,0 +1,117 @@
+import json
+import re
+from typing import Any
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.llms import (
+    CompletionResponse,
+    CompletionResponseGen,
+    CustomLLM,
+    LLMMetadata,
+)
+from llama_index.core.llms.callbacks import llm_completion_callback
+from pydantic import ConfigDict, Field
+
+from examples.utils.simulation import (
+    Simulator,
+    fake_completion,
+    fake_embedding,
+    fake_json,
+    tokenize,
+)
+
+# LlamaIndex LLM and embedding model (see `examples.utils.simulation`)
+
+_SCHEMA_MARKER = "Here's a JSON schema to follow:"
+_REACT_MARKER = "## Current Conversation"
+
+
+def _react_step(prompt: str) -> str:
+    # Call (once) every tool whose name shares a word with the question, then answer
+    header, conversation = prompt.split(_REACT_MARKER, 1)
+    tools = re.findall(r"> Tool Name: (\S+)", header)
+    called = set(re.findall(r"Action: (\S+)", conversation))
+    observations = re.findall(
+        r"Observation: (.*?)(?=\n\w+:|\Z)", conversation, flags=re.DOTALL
+    )
+    messages = re.findall(r"^user: (?!Observation:)(.*)$", conversation, flags=re.M)
+    question = messages[-1] if messages else conversation
+    words = set(tokenize(question))
+    wanted = [t for t in tools if words & set(tokenize(t.replace("_", " ")))]
+    wanted = wanted or tools[:1]
+    pending = [t for t in wanted if t not in called]
+    if pending:
+        return (
+            "Thought: I need to use a tool to help me answer the question.\n"
+            f"Action: {pending[0]}\n"
+            f"Action Input: {json.dumps({'input': question.strip()})}"
+        )
+    return (
+        "Thought: I can answer without using any more tools.\n"
+        f"Answer: {fake_completion(' '.join(observations) or question)}"
+    )
+
+
+def simulated_response(prompt: str) -> str:
+    if _SCHEMA_MARKER in prompt:
+        # Structured output (e.g. LLMTextCompletionProgram)
+        start = prompt.index("{", prompt.index(_SCHEMA_MARKER))
+        text = prompt[start:]
+        if text.startswith("{{"):  # braces are still escaped by the prompt template
+            text = text.replace("{{", "{").replace("}}", "}")
+        schema, _ = json.JSONDecoder().raw_decode(text)
+        # Lists have one item per numbered line of the prompt (e.g. batched inputs)
+        numbered = re.findall(r"^\d+\. ", prompt[: prompt.index(_SCHEMA_MARKER)], re.M)
+        return json.dumps(fake_json(schema, seed=prompt, array_size=len(numbered)))
+    if _REACT_MARKER in prompt:
+        return _react_step(prompt)
+    return fake_completion(prompt)
+
+
+class SimulatedLLM(CustomLLM):
+    model: str = "simulated"
+    temperature: float = 0.0
+    simulator: Simulator = Field(default_factory=lambda: Simulator("openai"))
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name=self.model)
+
+    @llm_completion_callback()
+    def complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponse:
+        self.simulator()
+        return CompletionResponse(text=simulated_response(prompt))
+
+    @llm_completion_callback()
+    def stream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseGen:
+        response = self.complete(prompt, formatted=formatted, **kwargs)
+        yield CompletionResponse(text=response.text, delta=response.text)
+
+
+class SimulatedEmbedding(BaseEmbedding):
+    dim: int = 1536
+    simulator: Simulator = Field(default_factory=lambda: Simulator("openai"))
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(model_name="simulated", **kwargs)
+
+    def _get_query_embedding(self, query: str):
+        return self._get_text_embedding(query)
+
+    async def _aget_query_embedding(self, query: str):
+        return self._get_text_embedding(query)
+
+    def _get_text_embedding(self, text: str):
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts):
+        self.simulator()  # one request per batch
+        return [fake_embedding(t, self.dim) for t in texts]
@@ -0,0 +1,171 @@
+import re
+import threading
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional
+
+from llama_index.core.callbacks import CBEventType, EventPayload
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+from llama_index.core.callbacks.token_counting import get_llm_token_counts
+from llama_index.core.utilities.token_counting import TokenCounter
+
+
+def step_type(output: str) -> str:
+    # Kind of ReAct reasoning step, from the agent LLM output
+    if re.search(r"^\s*Action\s*:", output, flags=re.M):
+        return "action"
+    if re.search(r"^\s*Answer\s*:", output, flags=re.M):
+        return "answer"
+    return "thought"
+
+
+def _llm_output(payload: Dict[str, Any]) -> str:
+    response = payload.get(EventPayload.RESPONSE, payload.get(EventPayload.COMPLETION))
+    if response is None:
+        return ""
+    if hasattr(response, "message"):
+        return response.message.content or ""
+    return getattr(response, "text", str(response))
+
+
+class _Trace:
+    # Events of the question being answered, in the order they are emitted
+    def __init__(self):
+        self.steps: List[Dict[str, Any]] = list()
+        self.starts: Dict[str, float] = dict()
+        self.total_latency = 0.0
+        self.llm_depth = 0
+        self.tool_depth = 0
+
+
+class ReActTraceHandler(BaseCallbackHandler):
+    """
+    Callback handler recording the reasoning steps of ReAct agents, per question.
+
+    Each agent LLM call is a step, recorded with its type (`action`, `answer` or
+    `thought`), latency and token counts. A step calling a tool also records the tool
+    output and latency, and the part of it spent retrieving and in the tool's own LLM
+    calls (synthesis). Events are attributed to the question returned by `key`, e.g. a
+    context variable set before running the agent, so that one handler serves concurrent
+    agents.
+
+    Args:
+        key (Callable[[], Any]): Returns the identifier of the current question.
+        token_counter (Optional[TokenCounter]): Counts the tokens of the LLM calls whose
+            response has no usage (default: the global tokenizer).
+    """
+
+    def __init__(
+        self, key: Callable[[], Any], token_counter: Optional[TokenCounter] = None
+    ):
+        super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+        self.key = key
+        self.token_counter = token_counter or TokenCounter()
+        self._traces: Dict[Any, _Trace] = dict()
+        self._lock = threading.Lock()
+
+    def _trace(self) -> _Trace:
+        key = self.key()
+        with self._lock:
+            if key not in self._traces:
+                self._traces[key] = _Trace()
+            return self._traces[key]
+
+    def on_event_start(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = "",
+        parent_id: str = "",
+        **kwargs: Any,
+    ) -> str:
+        trace = self._trace()
+        trace.starts[event_id] = perf_counter()
+        payload = payload or dict()
+        if event_type == CBEventType.LLM:
+            trace.llm_depth += 1
+        elif event_type == CBEventType.FUNCTION_CALL:
+            trace.tool_depth += 1
+            if trace.steps and trace.tool_depth == 1:
+                tool = payload.get(EventPayload.TOOL)
+                trace.steps[-1].update(
+                    tool=tool.name if tool is not None else None,
+                    tool_latency=0.0,
+                    retrieve_latency=0.0,
+                    synthesis_latency=0.0,
+                    tool_tokens=0,
+                )
+        return event_id
+
+    def on_event_end(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = "",
+        **kwargs: Any,
+    ) -> None:
+        trace = self._trace()
+        start = trace.starts.pop(event_id, None)
+        latency = perf_counter() - start if start is not None else 0.0
+        payload = payload or dict()
+        step = trace.steps[-1] if trace.steps else None
+        if event_type == CBEventType.LLM:
+            trace.llm_depth -= 1
+            if trace.llm_depth > 0:  # nested in another LLM call (e.g. chat -> complete)
+                return
+            counts = get_llm_token_counts(self.token_counter, payload, event_id)
+            if trace.tool_depth == 0:
+                trace.steps.append(
+                    {
+                        "step": len(trace.steps),
+                        "type": step_type(_llm_output(payload)),
+                        "llm_latency": latency,
+                        "prompt_tokens": counts.prompt_token_count,
+                        "completion_tokens": counts.completion_token_count,
+                        "tool": None,
+                        "tool_latency": None,
+                    }
+                )
+            elif step is not None:
+                step["synthesis_latency"] += latency
+                step["tool_tokens"] += counts.total_token_count
+        elif event_type == CBEventType.FUNCTION_CALL:
+            trace.tool_depth -= 1
+            if step is not None and trace.tool_depth == 0:
+                step["tool_latency"] = latency
+                step["tool_output"] = str(payload.get(EventPayload.FUNCTION_OUTPUT))
+        elif event_type == CBEventType.RETRIEVE:
+            if step is not None and trace.tool_depth > 0:
+                step["retrieve_latency"] += latency
+        elif event_type == CBEventType.AGENT_STEP:
+            trace.total_latency += latency
+
+    def start_trace(self, trace_id: Optional[str] = None) -> None:
+        pass
+
+    def end_trace(
+        self,
+        trace_id: Optional[str] = None,
+        trace_map: Optional[Dict[str, List[str]]] = None,
+    ) -> None:
+        pass
+
+    def pop(self, key: Any) -> Dict[str, Any]:
+        """The steps and summary of the question `key`, which is then forgotten."""
+        with self._lock:
+            trace = self._traces.pop(key, None) or _Trace()
+        steps = trace.steps
+        tool_steps = [s for s in steps if s["tool_latency"] is not None]
+        summary = {
+            "steps": len(steps),
+            "tool_calls": len(tool_steps),
+            "answered": bool(steps) and steps[-1]["type"] == "answer",
+            "total_latency": trace.total_latency,
+            "llm_latency": sum(s["llm_latency"] for s in steps),
+            "tool_latency": sum(s["tool_latency"] for s in tool_steps),
+            "retrieve_latency": sum(s["retrieve_latency"] for s in tool_steps),
+            "synthesis_latency": sum(s["synthesis_latency"] for s in tool_steps),
+            "prompt_tokens": sum(s["prompt_tokens"] for s in steps),
+            "completion_tokens": sum(s["completion_tokens"] for s in steps),
+            "tool_tokens": sum(s["tool_tokens"] for s in tool_steps),
+        }
+        return {"steps": steps, "summary": summary}
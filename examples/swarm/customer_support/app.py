@@ -6,6 +6,8 @@ from tqdm import tqdm
 
 from examples.swarm.customer_support.agents import customer_service_supervisor_agent
 from examples.swarm.customer_support.pipeline import pipeline
+from examples.swarm.simulated import SimulatedOpenAIClient
+from examples.utils.simulation import simulation_enabled
 
 if __name__ == "__main__":
     output_dir = Path("output")
@@ -13,7 +15,7 @@ if __name__ == "__main__":
     log = {}
 
     print("Running pipeline...")
-    client = Swarm()
+    client = Swarm(client=SimulatedOpenAIClient()) if simulation_enabled() else Swarm()
     for datum in tqdm(pipeline.dataset.data):
         response = client.run(
             agent=customer_service_supervisor_agent,
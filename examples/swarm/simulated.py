@@ -0,0 +1,95 @@
+import json
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_message_tool_call import (
+    ChatCompletionMessageToolCall,
+    Function,
+)
+
+from examples.utils.simulation import Simulator, fake_completion, tokenize
+
+# OpenAI client used by Swarm, `Swarm(client=SimulatedOpenAIClient())` (see
+# `examples.utils.simulation`)
+
+
+def _placeholder(schema: Dict[str, Any]) -> Any:
+    return [] if schema.get("type") == "array" else "simulated"
+
+
+def _pick_tool(question: str, tools: List[Dict]) -> Dict:
+    # The tool whose name and description share the most words with the question
+    words = set(tokenize(question))
+
+    def overlap(tool: Dict) -> int:
+        fn = tool["function"]
+        text = f"{fn['name'].replace('_', ' ')} {fn.get('description', '')}"
+        return len(words & set(tokenize(text)))
+
+    return max(tools, key=overlap)
+
+
+class _Completions:
+    def __init__(self, simulator: Simulator):
+        self.simulator = simulator
+
+    def create(
+        self,
+        model: str,
+        messages: List[Dict],
+        tools: Optional[List[Dict]] = None,
+        **kwargs: Any,
+    ) -> ChatCompletion:
+        self.simulator()
+        tools = tools or []
+        names = {t["function"]["name"] for t in tools}
+        already_called = any(
+            call["function"]["name"] in names
+            for m in messages
+            if m.get("role") == "assistant"
+            for call in (m.get("tool_calls") or [])
+        )
+        question = next(
+            (m["content"] for m in reversed(messages) if m.get("role") == "user"), ""
+        )
+        # Each agent calls its best matching tool once, then answers
+        if tools and not already_called:
+            tool = _pick_tool(question, tools)["function"]
+            args = {
+                name: _placeholder(schema)
+                for name, schema in tool.get("parameters", {}).get("properties", {}).items()
+            }
+            message = ChatCompletionMessage(
+                role="assistant",
+                content=None,
+                tool_calls=[
+                    ChatCompletionMessageToolCall(
+                        id=f"call_{uuid.uuid4().hex[:8]}",
+                        type="function",
+                        function=Function(name=tool["name"], arguments=json.dumps(args)),
+                    )
+                ],
+            )
+            finish_reason = "tool_calls"
+        else:
+            context = "\n".join(str(m.get("content") or "") for m in messages)
+            message = ChatCompletionMessage(
+                role="assistant", content=fake_completion(context)
+            )
+            finish_reason = "stop"
+        return ChatCompletion(
+            id=f"chatcmpl-{uuid.uuid4().hex[:8]}",
+            object="chat.completion",
+            created=int(time.time()),
+            model=model,
+            choices=[Choice(index=0, finish_reason=finish_reason, message=message)],
+        )
+
+
+class SimulatedOpenAIClient:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_Completions(Simulator("openai")))
@@ -0,0 +1,42 @@
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+
+def write_blob(path: Path, name: str, values: List[str]):
+    """Write `values` back to back in `<name>.bin`, with their offsets in `<name>_offsets.npy`."""
+    data = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(data) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(d) for d in data])
+    (path / f"{name}.bin").write_bytes(b"".join(data))
+    np.save(path / f"{name}_offsets.npy", offsets)
+
+
+def merge_blobs(paths: List[Path], out: Path, name: str):
+    """Concatenate the blobs `name` of the directories `paths` into `out`."""
+    offsets, size = [np.zeros(1, dtype=np.int64)], 0
+    with open(out / f"{name}.bin", "wb") as f:
+        for path in paths:
+            part = np.load(path / f"{name}_offsets.npy")
+            f.write((path / f"{name}.bin").read_bytes())
+            offsets.append(part[1:] + size)
+            size += int(part[-1])
+    np.save(out / f"{name}_offsets.npy", np.concatenate(offsets))
+
+
+class Blob:
+    """Strings written by `write_blob`, memory-mapped and decoded on access."""
+
+    def __init__(self, path: Path, name: str):
+        self.offsets = np.load(path / f"{name}_offsets.npy", mmap_mode="r")
+        self.data = b""
+        if self.offsets[-1] > 0:  # empty files cannot be memory-mapped
+            self.data = np.memmap(path / f"{name}.bin", dtype=np.uint8, mode="r")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        lo, hi = int(self.offsets[i]), int(self.offsets[i + 1])
+        return bytes(self.data[lo:hi]).decode("utf-8")
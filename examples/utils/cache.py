@@ -0,0 +1,237 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from loguru import logger
+
+
+def _default(obj: Any) -> Any:
+    # Best effort serialization of the call inputs (Documents, ChatMessages, ...)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if hasattr(obj, "__dict__"):
+        return vars(obj)
+    return str(obj)
+
+
+def make_key(provider: str, model: str, params: Optional[Dict], input: Any) -> str:
+    payload = json.dumps(
+        {"provider": provider, "model": model, "params": params or {}, "input": input},
+        sort_keys=True,
+        default=_default,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent, content-addressed cache of LLM, embedding and rerank responses.
+
+    Entries are keyed by provider, model, parameters and the hash of the input, stored
+    in SQLite and evicted least-recently-used first when the cache grows over `max_size`.
+    Calls sampled with `temperature > 0` bypass the cache unless `cache_sampled` is set.
+
+    Args:
+        path (Union[str, Path]): The SQLite database file.
+        max_size (int): Maximum size of the cached values, in bytes.
+        cache_sampled (bool): Cache responses generated with `temperature > 0` as well.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_size: int = 1024 * 1024 * 1024,
+        cache_sampled: bool = False,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.cache_sampled = cache_sampled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB, size INTEGER, accessed REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS accessed ON cache(accessed)")
+        self._conn.commit()
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()[0]
+
+    def bypass(self, params: Optional[Dict]) -> bool:
+        temperature = (params or {}).get("temperature")
+        return not self.cache_sampled and bool(temperature) and temperature > 0
+
+    def get(self, key: str):
+        """Return `(True, value)` on a hit, `(False, None)` otherwise."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+            self._conn.execute(
+                "UPDATE cache SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return True, pickle.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        blob = pickle.dumps(value)
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time()),
+            )
+            self._size += len(blob) - (old[0] if old else 0)
+            if self._size > self.max_size:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Drop the least recently used entries until the cache is back to 90% of its budget
+        target = int(self.max_size * 0.9)
+        rows = self._conn.execute(
+            "SELECT key, size FROM cache ORDER BY accessed ASC"
+        ).fetchall()
+        evicted = list()
+        for key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM cache WHERE key = ?", evicted)
+        logger.debug(f"Evicted {len(evicted)} entries from {self.path}")
+
+    def call(
+        self,
+        provider: str,
+        model: str,
+        params: Optional[Dict],
+        input: Any,
+        fn: Callable[[], Any],
+    ) -> Any:
+        """Return the cached response for the given call, or compute it with `fn` and cache it."""
+        if self.bypass(params):
+            return fn()
+        key = make_key(provider, model, params, input)
+        hit, value = self.get(key)
+        if hit:
+            return value
+        value = fn()
+        self.set(key, value)
+        return value
+
+
+class MemoryCache:
+    """
+    In-memory LRU cache whose entries expire `ttl` seconds after being set.
+
+    Args:
+        max_size (int): Maximum number of entries (0 disables the cache).
+        ttl (Optional[float]): Lifetime of an entry, in seconds (default: no expiry).
+    """
+
+    def __init__(self, max_size: int = 256, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str):
+        """Return `(True, value)` on a hit, `(False, None)` otherwise."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.time() > entry[0]:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key: str, value: Any):
+        if self.max_size <= 0:
+            return
+        expires = time.time() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """
+    Return the process-wide response cache, or None if disabled (`EXAMPLES_CACHE=false`).
+
+    The location, the size budget and whether sampled responses are cached are set with
+    `EXAMPLES_CACHE_PATH`, `EXAMPLES_CACHE_MAX_MB` and `EXAMPLES_CACHE_SAMPLED`.
+    """
+    global _cache
+    if os.getenv("EXAMPLES_CACHE", "true").lower() != "true":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                os.getenv("EXAMPLES_CACHE_PATH", ".cache/responses.sqlite"),
+                max_size=int(os.getenv("EXAMPLES_CACHE_MAX_MB", "1024")) * 1024 * 1024,
+                cache_sampled=os.getenv("EXAMPLES_CACHE_SAMPLED", "false").lower()
+                == "true",
+            )
+        return _cache
+
+
+def cached(provider: str, model: str, params: Optional[Dict] = None):
+    """
+    Decorator caching the results of a function calling `model` of `provider`.
+
+    The function arguments are the cache input, `params` are the generation parameters
+    (e.g. `{"temperature": 0.0}`) that are part of the key.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs) -> Any:
+            cache = get_cache()
+            if cache is None:
+                return fn(*args, **kwargs)
+            return cache.call(
+                provider,
+                model,
+                params,
+                {"args": args, "kwargs": kwargs},
+                lambda: fn(*args, **kwargs),
+            )
+
+        return wrapper
+
+    return decorator
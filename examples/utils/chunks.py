@@ -0,0 +1,137 @@
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+ChunkRef = Dict[str, Any]
+
+_SCORE_KEY = "relevance_score"  # query dependent, kept in the reference
+
+
+def _chunk_record(doc: Any) -> Dict[str, Any]:
+    record = dict(doc.__dict__)
+    record["metadata"] = {
+        k: v for k, v in (record.get("metadata") or {}).items() if k != _SCORE_KEY
+    }
+    return record
+
+
+def chunk_id(record: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        [record["page_content"], record["metadata"]], sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class ChunkTable:
+    """
+    Content-addressed table of the chunks referenced by the app logs.
+
+    Each chunk is stored once, the logs only keep `{"id": ..., "score": ...}` references.
+    When `filepath` is set, new chunks are appended to it as soon as they are first seen,
+    so the table is always in sync with the (streamed) log.
+
+    Args:
+        filepath (Optional[Union[str, Path]]): The JSONL file the chunks are written to.
+        resume (bool): Keep the chunks already in `filepath` instead of overwriting it.
+    """
+
+    def __init__(
+        self, filepath: Optional[Union[str, Path]] = None, resume: bool = True
+    ):
+        self._chunks: Dict[str, Dict[str, Any]] = dict()
+        self._lock = threading.Lock()
+        self._file = None
+        if filepath is not None:
+            filepath = Path(filepath)
+            if resume and filepath.exists():
+                self._truncate_partial_line(filepath)
+                self.load(filepath)
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(filepath, "a" if resume else "w")
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def __getitem__(self, id: str) -> Dict[str, Any]:
+        return self._chunks[id]
+
+    def ref(self, doc: Any) -> ChunkRef:
+        """Add the chunk of a Document (if new) and return its reference."""
+        record = _chunk_record(doc)
+        id = chunk_id(record)
+        with self._lock:
+            if id not in self._chunks:
+                self._chunks[id] = record
+                if self._file is not None:
+                    line = json.dumps({"chunk_id": id, **record}, ensure_ascii=False)
+                    self._file.write(line + "\n")
+                    self._file.flush()
+        ref = {"id": id}
+        score = (getattr(doc, "metadata", None) or {}).get(_SCORE_KEY)
+        if score is not None:
+            ref["score"] = score
+        return ref
+
+    def refs(self, docs: List[Any]) -> List[ChunkRef]:
+        return [self.ref(doc) for doc in docs]
+
+    def resolve(self, x: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the full document of a reference (documents logged in full are returned as is)."""
+        if "page_content" in x:
+            return x
+        record = self._chunks[x["id"]]
+        if "score" not in x:
+            return record
+        return {**record, "metadata": {**record["metadata"], _SCORE_KEY: x["score"]}}
+
+    def resolve_value(self, value: Any) -> Any:
+        """Resolve a logged module output if it is a list of references, else return it as is."""
+        if isinstance(value, list) and value and all(
+            isinstance(x, dict) and "id" in x for x in value
+        ):
+            return [self.resolve(x) for x in value]
+        return value
+
+    @staticmethod
+    def _truncate_partial_line(filepath: Path):
+        # Drop a partially written last line (e.g. the run was killed mid-write), so that
+        # new chunks are not appended to it
+        with open(filepath, "rb+") as f:
+            content = f.read()
+            end = content.rfind(b"\n") + 1
+            if end < len(content):
+                f.truncate(end)
+
+    def load(self, filepath: Union[str, Path]):
+        content = Path(filepath).read_bytes()
+        # A partially written last line is ignored
+        for line in content[: content.rfind(b"\n") + 1].splitlines():
+            if line.strip():
+                record = json.loads(line)
+                self._chunks[record.pop("chunk_id")] = record
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Process-wide table used by the pipelines to resolve the logged references
+_chunks = ChunkTable()
+
+
+def load_chunks(filepath: Union[str, Path]):
+    """Load a chunk table written by an app, so that its logs can be resolved."""
+    _chunks.load(filepath)
+
+
+def resolve_documents(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [_chunks.resolve(doc) for doc in docs]
@@ -0,0 +1,45 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Iterable, List, Optional, TypeVar
+
+from tqdm import tqdm
+
+T = TypeVar("T")
+
+
+def max_concurrency() -> int:
+    """Number of samples an app processes at the same time (`MAX_CONCURRENCY`, 1 = sequential)."""
+    return int(os.getenv("MAX_CONCURRENCY", "4"))
+
+
+def run_concurrently(
+    fn: Callable[[T], Any],
+    items: Iterable[T],
+    max_workers: int = 1,
+    desc: Optional[str] = None,
+) -> List[Any]:
+    """
+    Apply `fn` to every item using at most `max_workers` threads.
+
+    The example apps are dominated by network round-trips (retrieval, rerank,
+    generation), so a thread pool is enough to overlap them. With
+    `max_workers <= 1` items are processed sequentially, in order.
+
+    Args:
+        fn (Callable[[T], Any]): Function called once per item.
+        items (Iterable[T]): The items to process (e.g. dataset samples).
+        max_workers (int): Maximum number of items processed at the same time.
+        desc (Optional[str]): Progress bar description.
+
+    Returns:
+        List[Any]: The results, in the same order as `items`.
+    """
+    items = list(items)
+    if max_workers <= 1:
+        return [fn(item) for item in tqdm(items, desc=desc)]
+    results = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fn, item): idx for idx, item in enumerate(items)}
+        for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+            results[futures[future]] = future.result()
+    return results
@@ -0,0 +1,86 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from continuous_eval.eval import Module, Pipeline
+
+Stage = Callable[..., Any]
+
+
+def _upstream(module: Module) -> List[str]:
+    # Names of the modules `module` takes as input (dataset fields are read from the datum)
+    inputs = module.input if isinstance(module.input, (list, tuple)) else [module.input]
+    return [x.name for x in inputs if isinstance(x, Module)]
+
+
+class DagExecutor:
+    """
+    Run the stages of an app following the module graph declared by its `Pipeline`.
+
+    Each stage is called as `stage(datum, **upstream)` where `upstream` maps the names of
+    its input modules to their outputs. Stages whose inputs are ready run concurrently,
+    so the latency of a sample is the one of the critical path instead of the sum of
+    all the stages.
+
+    Args:
+        pipeline (Pipeline): The pipeline declaring the module graph.
+        stages (Dict[str, Stage]): The function computing the output of each module.
+        max_workers (Optional[int]): Maximum number of stages running at the same time
+            (default: one per module).
+    """
+
+    def __init__(
+        self,
+        pipeline: Pipeline,
+        stages: Dict[str, Stage],
+        max_workers: Optional[int] = None,
+    ):
+        self.stages = stages
+        self.dependencies = dict()
+        for name in stages:
+            module = pipeline.module_by_name(name)
+            missing = [x for x in _upstream(module) if x not in stages]
+            if missing:
+                raise ValueError(f"No stage for {missing}, required by {name}")
+            self.dependencies[name] = _upstream(module)
+        self._check_acyclic()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(stages))
+
+    def _check_acyclic(self):
+        done = set()
+        while len(done) < len(self.dependencies):
+            ready = {
+                name
+                for name, deps in self.dependencies.items()
+                if name not in done and all(d in done for d in deps)
+            }
+            if not ready:
+                raise ValueError("The module graph has a cycle")
+            done |= ready
+
+    def run(self, datum: Dict[str, Any]) -> Dict[str, Any]:
+        """Run all the stages on `datum` and return the output of each module."""
+        outputs: Dict[str, Any] = dict()
+        running = dict()
+        while len(outputs) < len(self.stages):
+            for name, deps in self.dependencies.items():
+                if name in outputs or name in running.values():
+                    continue
+                if all(d in outputs for d in deps):
+                    upstream = {d: outputs[d] for d in deps}
+                    future = self._executor.submit(
+                        self.stages[name], datum, **upstream
+                    )
+                    running[future] = name
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                outputs[running.pop(future)] = future.result()
+        return outputs
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,78 @@
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Union
+
+import numpy as np
+from loguru import logger
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Embeddings computed in large batches and persisted to disk, keyed by the hash of the text.
+
+    Use `embed` as a pre-stage to embed all the queries of a dataset with a handful of
+    requests, then look the vectors up with `get` and search the vector store by vector.
+
+    Args:
+        path (Union[str, Path]): The `.npz` file where the embeddings are stored.
+        embed_documents (EmbedFn): Function embedding a batch of texts
+            (e.g. `OpenAIEmbeddings().embed_documents`).
+        batch_size (int): Number of texts sent in a single request.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        embed_documents: EmbedFn,
+        batch_size: int = 1000,
+    ):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self._embed_documents = embed_documents
+        self._vectors: Dict[str, np.ndarray] = dict()
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with np.load(self.path) as data:
+                self._vectors = dict(zip(data["keys"].tolist(), data["vectors"]))
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def __contains__(self, text: str):
+        return text_hash(text) in self._vectors
+
+    def embed(self, texts: List[str], save: bool = True):
+        """Embed (in batches) all the texts not already in the store."""
+        missing = list({text_hash(t): t for t in texts if t not in self}.items())
+        if not missing:
+            return
+        logger.info(f"Embedding {len(missing)} texts in batches of {self.batch_size}")
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i : i + self.batch_size]
+            vectors = self._embed_documents([t for _, t in batch])
+            with self._lock:
+                for (key, _), vector in zip(batch, vectors):
+                    self._vectors[key] = np.asarray(vector, dtype=np.float32)
+        if save:
+            self.save()
+
+    def get(self, text: str) -> List[float]:
+        """Return the embedding of `text`, embedding it on the fly if it was not precomputed."""
+        key = text_hash(text)
+        if key not in self._vectors:
+            self.embed([text], save=False)
+        return self._vectors[key].tolist()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            keys = list(self._vectors.keys())
+            vectors = np.stack([self._vectors[k] for k in keys])
+        np.savez(self.path, keys=np.array(keys), vectors=vectors)
@@ -0,0 +1,42 @@
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from examples.utils.embeddings import text_hash
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[Document]],
+    k: int = 60,
+    top_n: Optional[int] = None,
+) -> List[Document]:
+    """
+    Merge several rankings of documents with Reciprocal Rank Fusion.
+
+    Documents with the same content are merged, and scored `sum(1 / (k + rank))` over the
+    rankings they appear in. The score is stored in the `relevance_score` metadata.
+
+    Args:
+        rankings (List[List[Document]]): The documents returned by each retriever, best first.
+        k (int): The RRF constant, dampening the weight of the top ranks.
+        top_n (Optional[int]): Number of documents kept (default: all).
+
+    Returns:
+        List[Document]: The deduplicated documents, by decreasing fused score.
+    """
+    docs: Dict[str, Document] = dict()
+    scores: Dict[str, float] = dict()
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = text_hash(doc.page_content)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    # Stable sort: ties keep the order in which the documents were first retrieved
+    keys = sorted(docs, key=lambda key: scores[key], reverse=True)[:top_n]
+    return [
+        Document(
+            page_content=docs[key].page_content,
+            metadata={**docs[key].metadata, "relevance_score": scores[key]},
+        )
+        for key in keys
+    ]
@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from continuous_eval.eval import Pipeline
+from continuous_eval.eval.logger import PipelineLogger
+from loguru import logger
+
+
+def resume_enabled() -> bool:
+    """True unless interrupted runs should be restarted from scratch (`RESUME=false`)."""
+    return os.getenv("RESUME", "true").lower() == "true"
+
+
+class StreamingPipelineLogger(PipelineLogger):
+    """
+    A `PipelineLogger` that streams samples to disk instead of keeping the whole run in memory.
+
+    Each sample is appended to `filepath` (in the same format as `PipelineLogger.save`) as
+    soon as it is marked complete, through a bounded write buffer, and dropped from memory.
+    When `resume` is set, the samples already in the file are skipped, so an interrupted
+    run continues where it stopped. Use it as a context manager so that the buffered
+    samples are written even when the run fails or is interrupted.
+
+    Args:
+        pipeline (Pipeline): The pipeline being logged.
+        filepath (Union[str, Path]): The JSONL file the samples are appended to.
+        buffer_size (int): Number of completed samples buffered before writing to disk.
+        resume (bool): Keep the samples already in `filepath` instead of overwriting it.
+        on_complete (Optional[Callable[[Any, Dict], None]]): Called with the uid and the
+            record of each sample marked complete (e.g. `OnlineEvaluator.add`).
+    """
+
+    def __init__(
+        self,
+        pipeline: Pipeline,
+        filepath: Union[str, Path],
+        buffer_size: int = 16,
+        resume: bool = True,
+        on_complete: Optional[Callable[[Any, Dict], None]] = None,
+    ):
+        super().__init__(pipeline=pipeline)
+        self.filepath = Path(filepath)
+        assert self.filepath.suffix == ".jsonl", "File must be a JSONL file"
+        self.buffer_size = buffer_size
+        self.on_complete = on_complete
+        self.completed = set()
+        self._buffer: List[str] = list()
+        self._lock = threading.RLock()
+        if resume and self.filepath.exists():
+            self._load_completed()
+        else:
+            self.filepath.parent.mkdir(parents=True, exist_ok=True)
+            self.filepath.write_text("")
+
+    def _load_completed(self):
+        with open(self.filepath, "rb+") as f:
+            content = f.read()
+            # Drop a partially written last line (e.g. the run was killed mid-write)
+            end = content.rfind(b"\n") + 1
+            if end < len(content):
+                f.truncate(end)
+        for line in content[:end].splitlines():
+            if line.strip():
+                self.completed.add(json.loads(line)["__uid"])
+        if self.completed:
+            logger.info(
+                f"Resuming from {self.filepath}: {len(self.completed)} samples already done"
+            )
+
+    def is_complete(self, uid: Any) -> bool:
+        return uid in self.completed
+
+    def pending(self, data: List[Dict]) -> List[Dict]:
+        """The dataset samples that are not complete yet."""
+        return [datum for datum in data if not self.is_complete(datum["uid"])]
+
+    def log(self, uid: Any, module: str, value: Any, **kwargs):
+        with self._lock:
+            super().log(uid=uid, module=module, value=value, **kwargs)
+
+    def complete(self, uid: Any):
+        """Mark the sample `uid` as complete: queue it for writing and release its memory."""
+        with self._lock:
+            record = self.data.pop(uid, None)
+            if record is None:
+                return
+            line = json.dumps({**{"__uid": uid}, **record}, ensure_ascii=False)
+            self._buffer.append(line)
+            self.completed.add(uid)
+            if len(self._buffer) >= self.buffer_size:
+                self.flush()
+        if self.on_complete is not None:
+            self.on_complete(uid, record)
+
+    def flush(self):
+        with self._lock:
+            if not self._buffer:
+                return
+            with open(self.filepath, "a") as f:
+                f.write("\n".join(self._buffer) + "\n")
+            self._buffer.clear()
+
+    def close(self):
+        """Write all the completed samples still buffered. Incomplete samples are discarded."""
+        self.flush()
+        if self.data:
+            logger.warning(f"{len(self.data)} incomplete samples not saved")
+
+    def save(self, filepath: Optional[Union[str, Path]] = None):
+        self.close()
+        if filepath is not None and Path(filepath).resolve() != self.filepath.resolve():
+            shutil.copyfile(self.filepath, filepath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,132 @@
+import inspect
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from continuous_eval.eval import Pipeline
+from continuous_eval.eval.modules import Module
+from continuous_eval.eval.result_types import PipelineResults
+from continuous_eval.eval.runner import EvaluationRunner
+from continuous_eval.metrics import Metric
+from continuous_eval.metrics.base.llm import LLMMetric
+from continuous_eval.metrics.base.probabilistic import ProbabilisticMetric
+from loguru import logger
+
+from examples.common import print_aggregated_results
+from examples.utils.chunks import ChunkTable
+
+# Metrics needing a model (LLM, BERT, ...) are too slow to run on every record
+_OFFLINE_METRICS = (LLMMetric, ProbabilisticMetric)
+_OFFLINE_MODULES = (
+    "continuous_eval.metrics.generation.text.bert",
+    "continuous_eval.metrics.generation.text.semantic",
+)
+
+
+def is_online(metric: Metric) -> bool:
+    return not isinstance(metric, _OFFLINE_METRICS) and not type(
+        metric
+    ).__module__.startswith(_OFFLINE_MODULES)
+
+
+def metric_kwargs(module: Module, metric: Metric, datum: Dict, record: Dict):
+    """
+    The arguments of `metric.compute` for one record.
+
+    They are prepared by `EvaluationRunner.prepare`, on a single record.
+
+    Args:
+        module (Module): The module the metric is attached to.
+        metric (Metric): The metric.
+        datum (Dict): The dataset datum of the record.
+        record (Dict): The logged module outputs of the record.
+    """
+    results = PipelineResults()
+    results.results = [{**datum, **record}]
+    kwargs = EvaluationRunner.prepare(
+        SimpleNamespace(data=[datum]), results, module, metric
+    )
+    names = set(inspect.signature(metric.compute).parameters) - {"kwargs"}
+    return {key: value[0] for key, value in kwargs.items() if key in names}
+
+
+class OnlineEvaluator:
+    """
+    Evaluates the pipeline records as soon as they are complete.
+
+    Only the metrics that are cheap to compute are evaluated (see `is_online`): each
+    completed record is passed to `add` (e.g. as the `on_complete` callback of a
+    `StreamingPipelineLogger`) and its metrics are computed. The results are aggregated
+    with the metrics' own `aggregate`. A live summary is printed every `report_every`
+    records, in the same format as `print_metric_results`, so that a bad run can be
+    stopped early.
+
+    Args:
+        pipeline (Pipeline): The pipeline being run, with its dataset.
+        report_every (int): Number of records between two summaries (0: never).
+        chunks (Optional[ChunkTable]): The chunk table of the app, to resolve the chunk
+            references of the records.
+    """
+
+    def __init__(
+        self,
+        pipeline: Pipeline,
+        report_every: int = 10,
+        chunks: Optional[ChunkTable] = None,
+    ):
+        self.pipeline = pipeline
+        self.report_every = report_every
+        self.chunks = chunks
+        self.count = 0
+        self._data = {datum["uid"]: datum for datum in pipeline.dataset.data}
+        self._modules = [
+            (module, [metric for metric in module.eval if is_online(metric)])
+            for module in pipeline.modules
+            if module.eval is not None
+        ]
+        self._results: Dict[str, Dict[str, List[Any]]] = {
+            module.name: {metric.name: list() for metric in metrics}
+            for module, metrics in self._modules
+        }
+        self._lock = threading.Lock()
+
+    def add(self, uid: Any, record: Dict[str, Any]):
+        """Evaluate the completed record `uid`."""
+        datum = self._data.get(uid)
+        if datum is None:
+            return
+        if self.chunks is not None:
+            record = {key: self.chunks.resolve_value(x) for key, x in record.items()}
+        results = list()
+        for module, metrics in self._modules:
+            for metric in metrics:
+                try:
+                    kwargs = metric_kwargs(module, metric, datum, record)
+                    results.append((module.name, metric.name, metric.compute(**kwargs)))
+                except Exception as e:
+                    logger.warning(f"{module.name}/{metric.name} failed on {uid}: {e}")
+        with self._lock:
+            for module_name, metric_name, result in results:
+                self._results[module_name][metric_name].append(result)
+            self.count += 1
+            report = self.report_every > 0 and self.count % self.report_every == 0
+        if report:
+            self.print_summary()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """The aggregated results so far, in the same format as `MetricsResults.aggregate`."""
+        with self._lock:
+            results = [
+                (module.name, metric, list(self._results[module.name][metric.name]))
+                for module, metrics in self._modules
+                for metric in metrics
+            ]
+        summary = {module.name: dict() for module, _ in self._modules}
+        for module_name, metric, values in results:
+            if values:
+                summary[module_name].update(metric.aggregate(values))
+        return summary
+
+    def print_summary(self):
+        print(f"\n# Online evaluation ({self.count} / {len(self._data)} samples)")
+        print_aggregated_results(self.summary())
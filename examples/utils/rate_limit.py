@@ -0,0 +1,210 @@
+import functools
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+from tenacity import (
+    Retrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+from tenacity.wait import wait_base
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    rpm: Optional[float] = None  # requests per minute
+    tpm: Optional[float] = None  # tokens per minute
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute / 60` tokens per second.
+
+    Callers reserve tokens up front, the bucket may go negative and the caller is told
+    how long to wait, so concurrent callers are served in arrival order.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens and return the number of seconds to wait before using them."""
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limiter shared by all the call sites
+    of a provider.
+    """
+
+    def __init__(self, limit: RateLimit):
+        self.limit = limit
+        self._requests = TokenBucket(limit.rpm) if limit.rpm else None
+        self._tokens = TokenBucket(limit.tpm) if limit.tpm else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0):
+        """Block until a request of `tokens` tokens can be sent."""
+        wait = 0.0
+        if self._requests is not None:
+            wait = max(wait, self._requests.reserve(1))
+        if self._tokens is not None and tokens > 0:
+            wait = max(wait, self._tokens.reserve(tokens))
+        with self._lock:
+            wait = max(wait, self._paused_until - time.monotonic())
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold back every caller of this provider for `seconds` (e.g. after a 429)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_limiters: Dict[str, RateLimiter] = dict()
+_limiters_lock = threading.Lock()
+
+
+def _limit_from_env(provider: str) -> RateLimit:
+    # No limit unless the quota is set with <PROVIDER>_RPM and <PROVIDER>_TPM, e.g.
+    # COHERE_RPM=10 for a trial key: quotas differ between keys, so by default only the
+    # rate limit errors (429) hold back the callers
+    rpm = os.getenv(f"{provider.upper()}_RPM")
+    tpm = os.getenv(f"{provider.upper()}_TPM")
+    return RateLimit(rpm=float(rpm) if rpm else None, tpm=float(tpm) if tpm else None)
+
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """Return the process-wide rate limiter of the given provider."""
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = RateLimiter(_limit_from_env(provider))
+        return _limiters[provider]
+
+
+def estimate_tokens(*texts: str) -> int:
+    # Rough estimate (~4 characters per token), good enough for budgeting
+    return sum(len(t) for t in texts if isinstance(t, str)) // 4 + 1
+
+
+def _status_code(e: BaseException) -> Optional[int]:
+    for obj in (e, getattr(e, "response", None)):
+        for attr in ("status_code", "code"):
+            status = getattr(obj, attr, None)
+            if isinstance(status, int):
+                return int(status)
+    return None
+
+
+def is_rate_limit_error(e: BaseException) -> bool:
+    return _status_code(e) == 429 or type(e).__name__ in {
+        "RateLimitError",
+        "TooManyRequestsError",
+        "ResourceExhausted",
+    }
+
+
+def retry_after(e: BaseException) -> Optional[float]:
+    """Seconds to wait according to the `retry-after` hints of a rate limit error, if any."""
+    headers = getattr(e, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(e, "response", None), "headers", None)
+    if not headers:
+        return None
+    headers = {str(k).lower(): v for k, v in dict(headers).items()}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000.0
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return float(value)
+            except ValueError:
+                date = parsedate_to_datetime(value)
+                return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class wait_retry_after(wait_base):
+    """Wait for the server `retry-after` hint, falling back to another wait strategy."""
+
+    def __init__(self, fallback: wait_base):
+        self.fallback = fallback
+
+    def __call__(self, retry_state) -> float:
+        hint = retry_after(retry_state.outcome.exception())
+        return hint if hint is not None else self.fallback(retry_state)
+
+
+def rate_limited(
+    provider: str,
+    count_tokens: Optional[Callable[..., int]] = None,
+    max_attempts: int = 10,
+    max_wait: float = 60.0,
+):
+    """
+    Decorator throttling a function through the `provider` rate limiter.
+
+    Rate limit errors (HTTP 429) are retried honoring the `retry-after` hints, or
+    with jittered exponential backoff, and pause all the other callers of the
+    same provider in the meantime.
+
+    Args:
+        provider (str): Provider name, e.g. "openai", "cohere" or "google".
+        count_tokens (Optional[Callable[..., int]]): Called with the function arguments,
+            returns the number of tokens consumed by the request.
+        max_attempts (int): Maximum number of attempts.
+        max_wait (float): Maximum backoff between two attempts, in seconds.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs) -> Any:
+            limiter = get_rate_limiter(provider)
+            tokens = count_tokens(*args, **kwargs) if count_tokens else 0
+
+            def on_rate_limit(retry_state):
+                delay = retry_state.next_action.sleep
+                logger.warning(
+                    f"{provider} rate limit hit, retrying {fn.__name__} in {delay:.1f}s"
+                )
+                limiter.pause(delay)
+
+            for attempt in Retrying(
+                stop=stop_after_attempt(max_attempts),
+                wait=wait_retry_after(wait_random_exponential(multiplier=1, max=max_wait)),
+                retry=retry_if_exception(is_rate_limit_error),
+                before_sleep=on_rate_limit,
+                sleep=lambda _: None,  # the limiter does the waiting
+                reraise=True,
+            ):
+                with attempt:
+                    limiter.acquire(tokens)
+                    return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
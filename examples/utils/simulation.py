@@ -0,0 +1,194 @@
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+# Offline simulation of the providers used by the examples (`SIMULATE=true`). Each
+# framework has its own stand-ins (the `simulated.py` modules) built on this module:
+# their outputs are deterministic (`fake_completion`, `fake_embedding`, ...) and every
+# call goes through a `Simulator`, which injects the latency and failures configured by
+# `SimulationConfig.from_env`.
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def simulation_enabled() -> bool:
+    """True when the apps should use the offline simulated providers (`SIMULATE=true`)."""
+    return os.getenv("SIMULATE", "false").lower() == "true"
+
+
+class SimulatedRateLimitError(Exception):
+    """HTTP 429 raised by the simulated providers, carrying a `retry-after` hint."""
+
+    status_code = 429
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"Simulated {provider} rate limit, retry after {retry_after}s")
+        self.headers = {"retry-after": str(retry_after)}
+
+
+class SimulatedProviderError(Exception):
+    """HTTP 500 raised by the simulated providers."""
+
+    status_code = 500
+
+
+@dataclass(frozen=True)
+class LatencyModel:
+    """
+    Latency distribution of a simulated call, in seconds.
+
+    Supported distributions are "constant" (always `mean`), "exponential" and
+    "lognormal" (with the given `mean` and shape `sigma`, i.e. a heavy right tail).
+    """
+
+    distribution: str = "lognormal"
+    mean: float = 0.5
+    sigma: float = 0.5
+
+    def sample(self, rng: random.Random) -> float:
+        if self.distribution == "constant":
+            return self.mean
+        if self.distribution == "exponential":
+            return rng.expovariate(1.0 / self.mean) if self.mean > 0 else 0.0
+        if self.distribution == "lognormal":
+            if self.mean <= 0:
+                return 0.0
+            mu = np.log(self.mean) - self.sigma**2 / 2
+            return rng.lognormvariate(mu, self.sigma)
+        raise ValueError(f"Unknown latency distribution {self.distribution}")
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        # "<distribution>:<mean>[:<sigma>]", e.g. "lognormal:0.8:0.6" or "constant:0"
+        parts = spec.split(":")
+        return cls(
+            distribution=parts[0],
+            mean=float(parts[1]) if len(parts) > 1 else cls.mean,
+            sigma=float(parts[2]) if len(parts) > 2 else cls.sigma,
+        )
+
+
+@dataclass(frozen=True)
+class SimulationConfig:
+    latency: LatencyModel = LatencyModel()
+    rate_limit_rate: float = 0.0  # probability of a 429 per call
+    error_rate: float = 0.0  # probability of a 500 per call
+    retry_after: float = 1.0
+    seed: int = 0
+
+    @classmethod
+    def from_env(cls, provider: str) -> "SimulationConfig":
+        """
+        Read the configuration of `provider` from the environment.
+
+        `SIMULATE_LATENCY`, `SIMULATE_RATE_LIMIT`, `SIMULATE_ERROR`, `SIMULATE_RETRY_AFTER`
+        and `SIMULATE_SEED` apply to every provider and can be overridden per provider,
+        e.g. `SIMULATE_COHERE_LATENCY=lognormal:1.5:0.8`.
+        """
+
+        def env(name: str, default: str) -> str:
+            return os.getenv(
+                f"SIMULATE_{provider.upper()}_{name}",
+                os.getenv(f"SIMULATE_{name}", default),
+            )
+
+        return cls(
+            latency=LatencyModel.parse(env("LATENCY", "lognormal:0.5:0.5")),
+            rate_limit_rate=float(env("RATE_LIMIT", "0")),
+            error_rate=float(env("ERROR", "0")),
+            retry_after=float(env("RETRY_AFTER", "1")),
+            seed=int(env("SEED", "0")),
+        )
+
+
+class Simulator:
+    """Injects latency, rate limit errors and failures into the simulated calls of a provider."""
+
+    def __init__(self, provider: str, config: Optional[SimulationConfig] = None):
+        self.provider = provider
+        self.config = config or SimulationConfig.from_env(provider)
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            latency = self.config.latency.sample(self._rng)
+            draw = self._rng.random()
+        time.sleep(latency)
+        if draw < self.config.rate_limit_rate:
+            raise SimulatedRateLimitError(self.provider, self.config.retry_after)
+        if draw < self.config.rate_limit_rate + self.config.error_rate:
+            raise SimulatedProviderError(f"Simulated {self.provider} failure")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """Deterministic hashed bag-of-words embedding (similar texts get similar vectors)."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in tokenize(text):
+        digest = hashlib.md5(token.encode("utf-8")).digest()
+        idx = int.from_bytes(digest[:4], "little") % dim
+        vector[idx] += 1.0 if digest[4] % 2 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm > 0 else vector).tolist()
+
+
+def fake_completion(prompt: str, max_words: int = 50) -> str:
+    """Deterministic completion: an excerpt of the context found in the prompt (or of the prompt)."""
+    match = re.search(r"Context[s]?:\s*(.+)", prompt, flags=re.DOTALL | re.IGNORECASE)
+    words = (match.group(1) if match else prompt).split()
+    if not words:
+        return ""
+    digest = int(hashlib.md5(prompt.encode("utf-8")).hexdigest(), 16)
+    start = digest % max(1, len(words) - max_words + 1)
+    return " ".join(words[start : start + max_words])
+
+
+def fake_relevance(query: str, text: str) -> float:
+    """Deterministic relevance score in [0, 1] (token overlap with the query)."""
+    q, t = set(tokenize(query)), set(tokenize(text))
+    return len(q & t) / len(q) if q else 0.0
+
+
+def fake_json(
+    schema: dict, seed: str, defs: Optional[dict] = None, array_size: int = 0
+) -> object:
+    """
+    Deterministic instance of a JSON schema (enums are picked by hashing `seed`).
+
+    Arrays have `array_size` items.
+    """
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return fake_json(defs[schema["$ref"].split("/")[-1]], seed, defs, array_size)
+    if "anyOf" in schema:
+        return fake_json(schema["anyOf"][0], seed, defs, array_size)
+    if "enum" in schema:
+        digest = int(hashlib.md5(seed.encode("utf-8")).hexdigest(), 16)
+        return schema["enum"][digest % len(schema["enum"])]
+    kind = schema.get("type", "object")
+    if kind == "object":
+        return {
+            name: fake_json(prop, f"{seed}/{name}", defs, array_size)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return [
+            fake_json(schema.get("items", {}), f"{seed}/{i}", defs, array_size)
+            for i in range(array_size)
+        ]
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "boolean":
+        return False
+    return fake_completion(seed, max_words=10)